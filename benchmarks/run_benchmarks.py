@@ -0,0 +1,446 @@
+"""Benchmarks of the label generation pipeline.
+
+Each benchmark runs in a fresh process (so that peak memory measurements are
+independent) and reports throughput, latency percentiles and peak RSS. With
+``--repeat N``, each case is run N times (each in a fresh process) and the
+latencies of all runs are pooled, which gives percentiles for the benchmarks
+timing one call per job. The results are written as JSON, and can be compared
+with a previous run:
+
+    python benchmarks/run_benchmarks.py -o new.json --compare old.json
+
+Run ``python benchmarks/run_benchmarks.py --help`` for all options.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+THIS_DIR = os.path.dirname(os.path.realpath(__file__))
+# Benchmark the blabel of this source tree rather than any installed version.
+sys.path.insert(0, os.path.join(THIS_DIR, ".."))
+SAMPLES_DIR = os.path.join(THIS_DIR, "..", "tests", "data", "samples")
+
+BENCHMARKS = {}
+
+
+def benchmark(name, sizes):
+    """Register a benchmark function, run for each of the given sizes.
+
+    The function receives a size and returns a list of latencies (in seconds)
+    of operations processing ``size / len(latencies)`` labels each.
+    """
+
+    def decorator(function):
+        BENCHMARKS[name] = (function, sizes)
+        return function
+
+    return decorator
+
+
+def time_calls(function, arguments):
+    """Call the function on each argument and return the latencies."""
+    latencies = []
+    for argument in arguments:
+        t0 = time.perf_counter()
+        function(argument)
+        latencies.append(time.perf_counter() - t0)
+    return latencies
+
+
+def time_iteration(iterable, latencies):
+    """Yield the elements of the iterable, recording the time between them."""
+    t0 = time.perf_counter()
+    for element in iterable:
+        yield element
+        latencies.append(time.perf_counter() - t0)
+        t0 = time.perf_counter()
+
+
+def sample_writer(sample, **kwargs):
+    import blabel
+
+    folder = os.path.join(SAMPLES_DIR, sample)
+    return blabel.LabelWriter(
+        os.path.join(folder, "item_template.html"),
+        default_stylesheets=(os.path.join(folder, "style.css"),),
+        default_base_url=folder,
+        **kwargs
+    )
+
+
+SAMPLE_RECORDS = {
+    "qrcode_and_date": lambda i: dict(sample_id="s%05d" % i, sample_name="S %d" % i),
+    "logo_and_datamatrix": lambda i: dict(sample_id="s%05d" % i, sample_name="S%d" % i),
+    "labels_from_spreadsheet": lambda i: dict(
+        task="Task %d" % i, importance=["low", "medium", "high"][i % 3], done="yes"
+    ),
+    "several_items_per_page": lambda i: dict(name="Name %d" % i, sex="MF"[i % 2]),
+}
+
+
+def sample_records(sample, n):
+    return [SAMPLE_RECORDS[sample](i) for i in range(n)]
+
+
+# SYMBOLOGY GENERATORS (unique data for each call, so the cache never hits)
+
+SYMBOLOGIES = {
+    "qr_code": dict(),
+    "qr_code_svg": dict(fmt="svg"),
+    "datamatrix": dict(),
+    "datamatrix_svg": dict(fmt="svg"),
+    "barcode": dict(),
+    "barcode_svg": dict(fmt="svg"),
+}
+
+
+def _symbology_benchmark(name, params):
+    def run(n):
+        from blabel import label_tools
+
+        function = getattr(label_tools, name.replace("_svg", ""))
+        data = ["EGF%06d" % i for i in range(n)]
+        return time_calls(lambda d: function(d, **params), data)
+
+    return run
+
+
+for _name, _params in SYMBOLOGIES.items():
+    benchmark("label_tools.%s" % _name, sizes=[1000])(
+        _symbology_benchmark(_name, _params)
+    )
+
+
+# HTML GENERATION
+
+
+@benchmark("record_to_html", sizes=[1000, 10000])
+def record_to_html(n):
+    label_writer = sample_writer("labels_from_spreadsheet")
+    return time_calls(
+        label_writer.record_to_html, sample_records("labels_from_spreadsheet", n)
+    )
+
+
+@benchmark("record_to_html.context_overhead", sizes=[100000])
+def record_to_html_context_overhead(n):
+    """Per-record overhead of record_to_html, with a trivial template and a
+    large default context (as in templates using many helper functions)."""
+    import blabel
+
+    context = {"helper_%d" % i: str for i in range(50)}
+    label_writer = blabel.LabelWriter(item_template="{{ name }}", **context)
+    records = [dict(name="Label %d" % i) for i in range(n)]
+    return time_calls(label_writer.record_to_html, records)
+
+
+@benchmark("record_to_html.loop_variables", sizes=[100000])
+def record_to_html_loop_variables(n):
+    """record_to_html with a template using record variables in a loop (they
+    are looked up again at each iteration), and a large default context."""
+    import blabel
+
+    context = {"helper_%d" % i: str for i in range(50)}
+    source = "{% for i in range(20) %}{{ a }}{{ b }}{{ c }}{{ d }}{% endfor %}"
+    label_writer = blabel.LabelWriter(item_template=source, **context)
+    records = [dict(a=i, b="b", c="c", d="d") for i in range(n)]
+    return time_calls(label_writer.record_to_html, records)
+
+
+@benchmark("records_to_html", sizes=[1000, 10000])
+def records_to_html(n):
+    """One latency per document of 100 labels."""
+    from blabel import tools
+
+    label_writer = sample_writer("labels_from_spreadsheet")
+    records = sample_records("labels_from_spreadsheet", n)
+    return time_calls(label_writer.records_to_html, tools.list_chunks(records, 100))
+
+
+def _dataframe_benchmark(to_records):
+    def run(n):
+        import blabel
+        import pandas
+
+        source = "{{ sample_id }} {{ sample_name }} {{ volume }}"
+        label_writer = blabel.LabelWriter(item_template=source)
+        dataframe = pandas.DataFrame(
+            dict(
+                sample_id=["s%06d" % i for i in range(n)],
+                sample_name=["Sample %d" % i for i in range(n)],
+                volume=[float(i % 100) for i in range(n)],
+            )
+        )
+        return time_calls(
+            lambda df: label_writer.records_to_html(to_records(df)), [dataframe]
+        )
+
+    return run
+
+
+# Records from a DataFrame converted to dicts, or read from its columns.
+benchmark("records_to_html.dataframe_to_dict", sizes=[100000])(
+    _dataframe_benchmark(lambda dataframe: dataframe.to_dict(orient="records"))
+)
+benchmark("records_to_html.dataframe", sizes=[100000])(
+    _dataframe_benchmark(lambda dataframe: dataframe)
+)
+
+
+# END TO END
+
+
+def _write_labels_benchmark(sample, **writer_params):
+    """One latency per job, for the default write_labels call (all labels in
+    one document). Use ``--repeat`` to get latency percentiles."""
+
+    def run(n):
+        label_writer = sample_writer(sample, **writer_params)
+        return time_calls(label_writer.write_labels, [sample_records(sample, n)])
+
+    return run
+
+
+def _write_labels_per_page_benchmark(sample, **writer_params):
+    """One latency per page: the records are rendered one page at a time
+    (``pages_per_batch=1``, one WeasyPrint render per page, then merged), and
+    each latency is the time between the reads of the records of two
+    successive pages. This is not the default rendering path."""
+
+    def run(n):
+        import itertools
+
+        from blabel import tools
+
+        label_writer = sample_writer(sample, **writer_params)
+        pages = tools.iter_chunks(
+            sample_records(sample, n), label_writer.items_per_page
+        )
+        latencies = []
+        records = itertools.chain.from_iterable(time_iteration(pages, latencies))
+        label_writer.write_labels(records, pages_per_batch=1)
+        return latencies
+
+    return run
+
+
+for _sample in SAMPLE_RECORDS:
+    _params = dict(items_per_page=3) if _sample == "several_items_per_page" else {}
+    benchmark("write_labels.%s" % _sample, sizes=[10, 1000, 10000])(
+        _write_labels_benchmark(_sample, **_params)
+    )
+    benchmark("write_labels.%s.per_page_batches" % _sample, sizes=[1000])(
+        _write_labels_per_page_benchmark(_sample, **_params)
+    )
+
+
+# MEMORY OF LARGE JOBS (see the peak RSS of these benchmarks)
+
+
+def _batch_pdfs(n_pages, pages_per_batch=100):
+    """Yield n_pages / pages_per_batch PDFs of pages_per_batch label pages."""
+    from blabel import tools
+
+    sample = os.path.join(SAMPLES_DIR, "qrcode_and_date", "qrcode_and_date.pdf")
+    with open(sample, "rb") as f:
+        sample_pdf = f.read()
+    # The sample PDF has 2 pages.
+    batch_pdf = tools.merge_pdfs([sample_pdf] * (pages_per_batch // 2))
+    for _ in range(n_pages // pages_per_batch):
+        yield batch_pdf
+
+
+@benchmark("merge_pdfs.streaming", sizes=[50000])
+def merge_pdfs_streaming(n):
+    """Merge batches of pages into a file, as in write_labels with
+    pages_per_batch. One latency per batch of 100 pages."""
+    import tempfile
+
+    from blabel import tools
+
+    latencies = []
+    with tempfile.TemporaryFile() as f:
+        tools.merge_pdfs(time_iteration(_batch_pdfs(n), latencies), target=f)
+    return latencies
+
+
+@benchmark("merge_pdfs.in_memory_writer", sizes=[50000])
+def merge_pdfs_in_memory_writer(n):
+    """Baseline: merging with a single pypdf PdfWriter, which keeps all the
+    pages in memory until the end."""
+    import tempfile
+    from io import BytesIO
+
+    from pypdf import PdfWriter
+
+    latencies = []
+    writer = PdfWriter()
+    for pdf in time_iteration(_batch_pdfs(n), latencies):
+        writer.append(BytesIO(pdf))
+    with tempfile.TemporaryFile() as f:
+        writer.write(f)
+    return latencies
+
+
+@benchmark("write_labels.streaming", sizes=[50000])
+def write_labels_streaming(n):
+    """Full render of 50k labels, by batches of 100 pages, to a file. One
+    latency per batch (the time between the reads of successive batches of
+    records)."""
+    import itertools
+    import tempfile
+
+    from blabel import tools
+
+    label_writer = sample_writer("qrcode_and_date")
+    records = (SAMPLE_RECORDS["qrcode_and_date"](i) for i in range(n))
+    latencies = []
+    batches = time_iteration(tools.iter_chunks(records, 100), latencies)
+    with tempfile.TemporaryFile() as f:
+        label_writer.write_labels(
+            itertools.chain.from_iterable(batches), target=f, pages_per_batch=100
+        )
+    return latencies
+
+
+# RUNNER
+
+
+def peak_rss_mb():
+    if resource is None:
+        return float("nan")
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes.
+    return peak / (1024.0 ** 2 if sys.platform == "darwin" else 1024.0)
+
+
+def percentile(values, q):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(q / 100.0 * (len(values) - 1))))
+    return values[index]
+
+
+def run_case(name, size):
+    """Run one benchmark at one size (in a fresh process).
+
+    Returns a dict with the latencies, total time and peak RSS of the run.
+    """
+    function, _ = BENCHMARKS[name]
+    t0 = time.perf_counter()
+    latencies = function(size)
+    total_time = time.perf_counter() - t0
+    return dict(latencies=latencies, total_time=total_time, peak_rss_mb=peak_rss_mb())
+
+
+def case_stats(name, size, runs):
+    """Return the stats of the runs of a case, with their latencies pooled."""
+    latencies = [latency for run in runs for latency in run["latencies"]]
+    return dict(
+        benchmark=name,
+        size=size,
+        runs=len(runs),
+        total_time=sum(run["total_time"] for run in runs),
+        throughput=size * len(runs) / sum(latencies),
+        latency_p50=percentile(latencies, 50),
+        latency_p90=percentile(latencies, 90),
+        latency_p99=percentile(latencies, 99),
+        peak_rss_mb=max(run["peak_rss_mb"] for run in runs),
+    )
+
+
+def run_benchmarks(names, sizes=None, repeat=1):
+    """Run the given benchmarks, each in a fresh process, and return stats."""
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for name in names:
+        for size in BENCHMARKS[name][1]:
+            if sizes is not None and size not in sizes:
+                continue
+            runs = []
+            for _ in range(repeat):
+                with ProcessPoolExecutor(1, mp_context=context) as executor:
+                    runs.append(executor.submit(run_case, name, size).result())
+            result = case_stats(name, size, runs)
+            print(
+                "{benchmark:<54} {size:>6} labels {throughput:>10.1f} labels/s"
+                "  p50 {latency_p50:.2e}s  p99 {latency_p99:.2e}s"
+                "  peak RSS {peak_rss_mb:.0f}MB".format(**result)
+            )
+            results.append(result)
+    return results
+
+
+def compare(results, reference):
+    """Print the throughput ratios between results and reference results."""
+    reference = {(r["benchmark"], r["size"]): r for r in reference["results"]}
+    for result in results:
+        old = reference.get((result["benchmark"], result["size"]))
+        if old is not None:
+            ratio = result["throughput"] / old["throughput"]
+            print(
+                "{:<54} {:>6} labels  x{:.2f} throughput".format(
+                    result["benchmark"], result["size"], ratio
+                )
+            )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "-k", "--filter", default="", help="Only run benchmarks containing this."
+    )
+    parser.add_argument(
+        "--sizes", help="Comma-separated sizes to run, e.g. 10,1000 (default: all)."
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=1,
+        help="Runs per case (each in a fresh process), with pooled latencies.",
+    )
+    parser.add_argument("-o", "--output", help="Path of the JSON results file.")
+    parser.add_argument("--compare", help="Path to JSON results to compare with.")
+    parser.add_argument(
+        "--list", action="store_true", help="List the benchmarks and exit."
+    )
+    args = parser.parse_args(argv)
+
+    names = [name for name in BENCHMARKS if args.filter in name]
+    if args.list:
+        for name in names:
+            print(name, BENCHMARKS[name][1])
+        return
+    sizes = None if args.sizes is None else [int(s) for s in args.sizes.split(",")]
+    results = run_benchmarks(names, sizes=sizes, repeat=args.repeat)
+
+    from blabel.version import __version__
+
+    report = dict(
+        blabel_version=__version__,
+        python_version=platform.python_version(),
+        platform=platform.platform(),
+        cpu_count=os.cpu_count(),
+        date=time.strftime("%Y-%m-%dT%H:%M:%S"),
+        results=results,
+    )
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare is not None:
+        with open(args.compare, "r") as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
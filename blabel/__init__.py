@@ -1,6 +1,16 @@
-""" blabel/__init__.py """
+"""blabel/__init__.py"""
 
 # __all__ = []
 
-from .blabel import LabelWriter
+from .blabel import LabelWriter, RecordValidationError
+from .profiling import RenderStats
 from .tools import JupyterPDF
+
+
+def __getattr__(name):
+    # Imported on first use, as asyncio is slow to import.
+    if name == "AsyncLabelWriter":
+        from .aio import AsyncLabelWriter
+
+        return AsyncLabelWriter
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
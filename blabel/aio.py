@@ -0,0 +1,106 @@
+"""Asyncio interface to label writing, e.g. for use in web services."""
+
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+
+class AsyncLabelWriter:
+    """Write labels from asyncio code without blocking the event loop.
+
+    The rendering runs in an executor and the number of documents rendered at
+    the same time is capped. By default the executor is a pool of processes,
+    as WeasyPrint's layout is CPU-bound Python code (threads would not run
+    in parallel) and its font configuration is shared by all the renders of
+    a process and can't be used by several threads at once. Calls can be
+    cancelled or given a timeout: a render which has not started yet is
+    dropped, while a render already running finishes in the background (its
+    slot only becomes available again once it is done, so the concurrency
+    cap always holds).
+
+    Parameters
+    ----------
+
+    label_writer
+      The ``LabelWriter`` used to render the labels.
+
+    max_concurrency
+      Maximal number of documents rendered at the same time. Further calls
+      wait for a slot to be free.
+
+    executor
+      A ``concurrent.futures`` executor in which the rendering will run. By
+      default, a process pool with ``max_concurrency`` processes is created,
+      and shut down when the writer is closed. The label writer and the
+      records are then sent to the processes, so they must be picklable (the
+      item template must be given as a path or a string), the target must
+      be None or a file path, and ``stats`` are not collected. Only provide
+      a thread pool if the renders can't run at the same time (e.g. with
+      ``max_concurrency=1``).
+
+    timeout
+      Default timeout in seconds of the ``write_labels`` calls, including the
+      time spent waiting for a free slot (None for no timeout).
+
+    Examples
+    --------
+
+    >>> async with AsyncLabelWriter(label_writer, max_concurrency=4) as writer:
+    >>>     pdf_data = await writer.write_labels(records, timeout=30)
+    """
+
+    def __init__(self, label_writer, max_concurrency=2, executor=None, timeout=None):
+        self.label_writer = label_writer
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._owns_executor = executor is None
+        if executor is None:
+            executor = ProcessPoolExecutor(max_concurrency)
+        self.executor = executor
+        self._semaphore = None
+
+    async def write_labels(self, records, target=None, timeout=None, **kwargs):
+        """Write the PDF document containing the labels to be printed.
+
+        Same parameters as ``LabelWriter.write_labels``, plus a ``timeout``
+        in seconds overriding the writer's default timeout. With the default
+        target, the raw PDF data is returned. Raises ``asyncio.TimeoutError``
+        if the timeout is exceeded.
+        """
+        if timeout is None:
+            timeout = self.timeout
+        function = partial(
+            self.label_writer.write_labels, records, target=target, **kwargs
+        )
+        return await asyncio.wait_for(self._run(function), timeout)
+
+    async def _run(self, function):
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        await self._semaphore.acquire()
+        try:
+            future = self.executor.submit(function)
+        except BaseException:
+            self._semaphore.release()
+            raise
+
+        def release_slot(_future):
+            try:
+                loop.call_soon_threadsafe(self._semaphore.release)
+            except RuntimeError:  # The event loop is already closed.
+                pass
+
+        future.add_done_callback(release_slot)
+        return await asyncio.wrap_future(future)
+
+    def close(self, wait=True):
+        """Shut down the executor if it was created by this writer."""
+        if self._owns_executor:
+            self.executor.shutdown(wait=wait)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close(wait=False)
@@ -1,14 +1,115 @@
+import copy
+import hashlib
+import itertools
 import os
-from io import BytesIO
+import pickle
+import time
+from collections import ChainMap
+from functools import lru_cache, partial
 
 import jinja2
-from weasyprint import HTML
+import jinja2.meta
+
+from . import caching
+from . import columnar
 from . import label_tools
+from . import profiling
 from . import tools
+from .version import __version__
 
 THIS_PATH = os.path.dirname(os.path.realpath(__file__))
-with open(os.path.join(THIS_PATH, "data", "print_template.html"), "r") as f:
-    PRINT_TEMPLATE = jinja2.Template(f.read())
+
+
+class _PathLoader(jinja2.BaseLoader):
+    """Jinja2 loader where the template names are paths to template files.
+
+    Templates loaded through an environment using this loader are kept in
+    the environment's cache and only reloaded when their file's modification
+    time changes.
+    """
+
+    def __init__(self, encoding=None):
+        self.encoding = encoding
+
+    def get_source(self, environment, template):
+        path = os.path.abspath(template)
+        try:
+            mtime = os.path.getmtime(path)
+            with open(path, "r", encoding=self.encoding) as f:
+                source = f.read()
+        except OSError:
+            raise jinja2.TemplateNotFound(template)
+
+        def uptodate():
+            try:
+                return os.path.getmtime(path) == mtime
+            except OSError:
+                return False
+
+        return source, path, uptodate
+
+
+def _bytecode_cache():
+    """Return a filesystem bytecode cache, or None if no folder is usable."""
+    try:
+        return jinja2.FileSystemBytecodeCache()
+    except (OSError, RuntimeError):
+        return None
+
+
+@lru_cache(maxsize=None)
+def get_jinja_environment(encoding=None):
+    """Return the jinja2 environment shared by all label writers.
+
+    There is one environment per template file encoding (None meaning the
+    locale's preferred encoding). Template files are compiled once and
+    cached by path and modification time, and the compiled bytecode is also
+    stored on disk so that new processes can skip the compilation.
+    """
+    return jinja2.Environment(
+        loader=_PathLoader(encoding),
+        bytecode_cache=_bytecode_cache(),
+        auto_reload=True,
+    )
+
+
+@lru_cache(maxsize=128)
+def template_from_string(source):
+    """Return a compiled jinja2 template, cached by source."""
+    return get_jinja_environment().from_string(source)
+
+
+@lru_cache(maxsize=128)
+def _undeclared_variables(source):
+    ast = get_jinja_environment().parse(source)
+    return frozenset(jinja2.meta.find_undeclared_variables(ast))
+
+
+@lru_cache(maxsize=None)
+def get_print_template():
+    """Return the template of the document in which the items are printed.
+
+    It is only loaded on first use, to keep ``import blabel`` fast.
+    """
+    return get_jinja_environment().get_template(
+        os.path.join(THIS_PATH, "data", "print_template.html")
+    )
+
+
+@lru_cache(maxsize=None)
+def get_sheet_template():
+    """Return the template of documents of labels placed on sheets."""
+    return get_jinja_environment().get_template(
+        os.path.join(THIS_PATH, "data", "sheet_template.html")
+    )
+
+
+def __getattr__(name):
+    # PRINT_TEMPLATE used to be loaded at import time, keep it available.
+    if name == "PRINT_TEMPLATE":
+        return get_print_template()
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
 
 GLOBALS = {
     "list": list,
@@ -19,7 +120,114 @@ GLOBALS = {
 }
 
 
-def write_pdf(html, target=None, base_url=None, extra_stylesheets=()):
+@lru_cache(maxsize=None)
+def get_font_config():
+    """Return the font configuration shared by all stylesheets and renders."""
+    try:
+        from weasyprint.text.fonts import FontConfiguration
+    except ImportError:  # WeasyPrint < 53
+        from weasyprint.fonts import FontConfiguration
+    return FontConfiguration()
+
+
+@lru_cache(maxsize=256)
+def _parse_stylesheet(path, mtime):
+    from weasyprint import CSS
+
+    return CSS(filename=path, font_config=get_font_config())
+
+
+def load_stylesheets(stylesheets):
+    """Return parsed ``weasyprint.CSS`` objects for a list of stylesheets.
+
+    Stylesheets given as paths are parsed once and cached by path and
+    modification time, so editing a file invalidates its cached version.
+    Stylesheets given as ``weasyprint.CSS`` objects are returned as-is.
+    """
+    result = []
+    for stylesheet in stylesheets:
+        if isinstance(stylesheet, (str, os.PathLike)):
+            path = os.path.abspath(stylesheet)
+            stylesheet = _parse_stylesheet(path, os.path.getmtime(path))
+        result.append(stylesheet)
+    return result
+
+
+@lru_cache(maxsize=256)
+def _file_digest(path, mtime):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _stylesheets_key(stylesheets):
+    """Return a tuple identifying the content of a list of stylesheets.
+
+    Stylesheet files are identified by a hash of their content (computed
+    once per modification time). Returns None if some stylesheets are
+    ``weasyprint.CSS`` objects: these only keep their parsed rules, so their
+    content can't be identified (and their id may be reused by other
+    objects), and pages rendered with them must not be cached.
+    """
+    key = []
+    for stylesheet in stylesheets:
+        if not isinstance(stylesheet, (str, os.PathLike)):
+            return None
+        path = os.path.abspath(stylesheet)
+        key.append(_file_digest(path, os.path.getmtime(path)))
+    return tuple(key)
+
+
+def _page_key(layout_key, stylesheets_key, base_url, page):
+    """Return a key identifying the rendering of a page of items HTMLs.
+
+    The key includes the version of blabel (whose page templates and
+    rendering may change), so that persistent caches of pages are not reused
+    across versions.
+    """
+    key = ("page", __version__, layout_key, stylesheets_key, base_url, tuple(page))
+    return caching.hash_key(key)
+
+
+@lru_cache(maxsize=None)
+def _hide_stamped_fields_stylesheet():
+    from weasyprint import CSS
+
+    from . import stamping
+
+    return CSS(string=stamping.HIDE_STAMPED_FIELDS_CSS, font_config=get_font_config())
+
+
+def _resource_url_fetcher(resources):
+    """Return a WeasyPrint URL fetcher serving the given resources.
+
+    ``resources`` is a dict ``{url: (mime_type, data)}`` as returned by
+    ``tools.hoist_data_uris``. Other URLs are fetched normally.
+    """
+    try:
+        from weasyprint.urls import URLFetcher, URLFetcherResponse
+    except ImportError:  # WeasyPrint < 67, URL fetchers are functions
+        from weasyprint import default_url_fetcher
+
+        def url_fetcher(url):
+            if url in resources:
+                mime_type, data = resources[url]
+                return dict(string=data, mime_type=mime_type, redirected_url=url)
+            return default_url_fetcher(url)
+
+        return url_fetcher
+
+    class ResourceURLFetcher(URLFetcher):
+        def fetch(self, url, headers=None):
+            if url in resources:
+                mime_type, data = resources[url]
+                headers = {"Content-Type": mime_type}
+                return URLFetcherResponse(url, body=data, headers=headers)
+            return super().fetch(url, headers)
+
+    return ResourceURLFetcher()
+
+
+def write_pdf(html, target=None, base_url=None, extra_stylesheets=(), resources=None):
     """Write the provided HTML in a PDF file.
 
     Parameters
@@ -28,8 +236,9 @@ def write_pdf(html, target=None, base_url=None, extra_stylesheets=()):
       A HTML string
 
     target
-      A PDF file path or file-like object, or None for returning the raw bytes
-      of the PDF.
+      A PDF file path or writable stream (which doesn't need to be seekable),
+      or None for returning the raw bytes of the PDF, or "@memoryview" for
+      returning a memoryview of the PDF data without copying it.
 
     base_url
       The base path from which relative paths in the HTML template start.
@@ -40,16 +249,108 @@ def write_pdf(html, target=None, base_url=None, extra_stylesheets=()):
 
     extra_stylesheets
       List of paths to other ".css" files used to define new styles or
-      overwrite default styles.
+      overwrite default styles. Files are parsed once and reused across calls
+      (see ``load_stylesheets``).
+
+    resources
+      Dict ``{url: (mime_type, data)}`` of resources referenced in the HTML,
+      typically obtained with ``tools.hoist_data_uris``.
+    """
+    from weasyprint import HTML
+
+    with profiling.measure("layout"):
+        url_fetcher = None if not resources else _resource_url_fetcher(resources)
+        weasy_html = HTML(string=html, base_url=base_url, url_fetcher=url_fetcher)
+        document = weasy_html.render(
+            stylesheets=load_stylesheets(extra_stylesheets),
+            font_config=get_font_config(),
+        )
+    with profiling.measure("pdf_write"):
+        return tools.write_to_target(document.write_pdf, target)
+
+
+def _render_pdf_shard(document, base_url, stylesheets, collect_stats=False):
+    """Render the HTML of one shard (or batch) of labels into PDF bytes.
+
+    ``document`` is a ``(html, resources)`` tuple. This is a module-level
+    function so it can be sent to worker processes. If ``collect_stats`` is
+    True, a ``(pdf_data, stats_dict)`` tuple is returned so the worker's
+    timings can be sent back to the main process.
     """
-    weasy_html = HTML(string=html, base_url=base_url)
-    if target in [None, "@memory"]:
-        with BytesIO() as buffer:
-            weasy_html.write_pdf(buffer, stylesheets=extra_stylesheets)
-            pdf_data = buffer.getvalue()
-        return pdf_data
-    else:
-        weasy_html.write_pdf(target, stylesheets=extra_stylesheets)
+    html, resources = document
+    if not collect_stats:
+        return write_pdf(html, None, base_url, stylesheets, resources=resources)
+    stats = profiling.RenderStats()
+    with stats.activate():
+        pdf_data = write_pdf(html, None, base_url, stylesheets, resources=resources)
+    return pdf_data, stats.to_dict()
+
+
+def _collect_shard_stats(results, stats):
+    """Merge the stats sent back by the workers, and yield the PDF data."""
+    for pdf_data, shard_stats in results:
+        stats.merge(shard_stats)
+        yield pdf_data
+
+
+def _items_htmls_chunk(label_writer, records, collect_stats=False):
+    """Return the items HTMLs of a chunk of records, and the stats if asked.
+
+    This is a module-level function so it can be sent to worker processes.
+    The stats are returned as a RenderStats, which keeps the slowest records.
+    """
+    if not collect_stats:
+        return label_writer._items_htmls(records), None
+    stats = profiling.RenderStats()
+    with stats.activate():
+        items_htmls = label_writer._items_htmls(records)
+    return items_htmls, stats
+
+
+def _records_errors(label_writer, indexed_records, variables=None):
+    """Return the ``(index, error)`` of the invalid records of a chunk.
+
+    This is a module-level function so it can be sent to worker processes.
+    """
+    errors = []
+    with label_tools.validation_mode():
+        for index, record in indexed_records:
+            error = label_writer._record_error(record, variables)
+            if error is not None:
+                errors.append((index, error))
+    return errors
+
+
+def _map_chunks(function, iterable, workers, chunksize, executor=None):
+    """Yield the results of the function on chunks of the iterable, in order.
+
+    The chunks are processed by a pool of ``workers`` processes, or by the
+    given executor (e.g. one already used to render the PDFs).
+    """
+    chunks = tools.iter_chunks(iterable, chunksize)
+    if executor is not None:
+        for result in tools.imap_bounded(executor, function, chunks, 2 * workers):
+            yield result
+        return
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(workers) as executor:
+        for result in tools.imap_bounded(executor, function, chunks, 2 * workers):
+            yield result
+
+
+class RecordValidationError(ValueError):
+    """Error raised when some records can't be turned into labels.
+
+    The ``errors`` attribute is a list of ``(index, message)`` with the
+    index of each invalid record and the reason why it is invalid.
+    """
+
+    def __init__(self, errors):
+        self.errors = errors
+        lines = ["record %d: %s" % (index, message) for index, message in errors]
+        message = "%d invalid record(s):\n%s" % (len(errors), "\n".join(lines))
+        super().__init__(message)
 
 
 class LabelWriter:
@@ -66,11 +367,12 @@ class LabelWriter:
 
     item_template
       jinja2.Template object to serve as a template for translating a dict
-      record into the HTML of one item.  
+      record into the HTML of one item.
 
     default_stylesheets
       List of ``weasyprint.CSS`` objects or path to ``.css`` spreadsheets
-      to be used for default styling.
+      to be used for default styling. Stylesheet files are only parsed once
+      (and again if they are modified), then reused for every PDF.
 
     default_base_url
       Path to use as origin for relative paths in the HTML document.
@@ -85,9 +387,19 @@ class LabelWriter:
     encoding
       The encoding of the item template file.
 
+    sheet
+      A ``sheets.SheetLayout``, or the name of a layout in ``sheets.SHEETS``
+      (e.g. "avery-l7651"), to print the labels on sheets with several labels
+      per page. The labels are placed at absolute positions on the page, and
+      ``items_per_page`` is set to the number of labels per sheet.
+
     **default_context
       Use keywords to add any variable, function, etc. that you are using in
       the templates.
+
+    Label writers can be pickled (and so sent to worker processes) if their
+    item template was given as a path or a string, and their stylesheets
+    and default context are picklable (paths, module-level functions, etc.).
     """
 
     def __init__(
@@ -98,58 +410,534 @@ class LabelWriter:
         default_base_url=None,
         items_per_page=1,
         encoding=None,
+        sheet=None,
         **default_context
     ):
         if item_template_path is not None:
-            if encoding is not None:
-                with open(item_template_path, "r", encoding=encoding) as f:
-                    item_template = f.read()
-            else:  # use locale.getpreferredencoding()
-                with open(item_template_path, "r") as f:
-                    item_template = f.read()
+            # encoding=None uses locale.getpreferredencoding()
+            environment = get_jinja_environment(encoding)
+            path = os.path.abspath(item_template_path)
+            item_template = environment.get_template(path)
 
+        self._item_template_source = None
         if isinstance(item_template, str):
-            item_template = jinja2.Template(item_template)
+            self._item_template_source = item_template
+            item_template = template_from_string(item_template)
+        self.encoding = encoding
         self.default_context = default_context if default_context else {}
         self.default_stylesheets = default_stylesheets
         self.default_base_url = default_base_url
         self.item_template = item_template
         self.items_per_page = items_per_page
+        self.sheet = None
+        self._layout_key = "items-per-page"
+        if sheet is not None:
+            from .sheets import get_sheet
+
+            self.sheet = get_sheet(sheet)
+            self.items_per_page = self.sheet.labels_per_sheet
+            self._sheet_css = self.sheet.css()
+            self._sheet_positions = [
+                "left: %.3fmm; top: %.3fmm" % position
+                for position in self.sheet.positions()
+            ]
+            self._layout_key = (self._sheet_css, tuple(self._sheet_positions))
 
     def record_to_html(self, record):
-        """Convert one record to an html string using the item template."""
-        context = dict(GLOBALS.items())
-        context.update(self.default_context)
-        context.update(record)
-        return self.item_template.render(**context)
+        """Convert one record to an html string using the item template.
+
+        The variables are looked up in the record, then in the writer's
+        default context, then in GLOBALS and the template's globals.
+        """
+        return self._render_record(record, self._default_variables())
+
+    def _render_record(self, record, default_variables):
+        """Render a record, with the variables of ``_default_variables()``.
+
+        The default variables are the parent of the template's context, and
+        only the record is copied in the context's own variables, rather
+        than merging all variables in a new dict for each record (which, for
+        large batches, was a significant part of the time spent outside of
+        the template itself). Both are plain dicts, as Jinja looks variables
+        up again at each iteration of the template's loops.
+        """
+        template = self.item_template
+        environment = template.environment
+        if environment.is_async:
+            return template.render(ChainMap(record, default_variables))
+        context = template.new_context(default_variables, shared=True)
+        context.vars.update(record)
+        try:
+            return environment.concat(template.root_render_func(context))
+        except Exception:
+            return environment.handle_exception()
 
-    def records_to_html(self, records, target=None):
+    def _default_variables(self):
+        """Return the default context, GLOBALS and template globals merged.
+
+        The dict is kept with shallow copies of its sources, and only merged
+        again when the template or one of the sources changed.
+        """
+        template = self.item_template
+        sources = [self.default_context, GLOBALS]
+        sources.extend(getattr(template.globals, "maps", [template.globals]))
+        cache = self.__dict__.get("_default_variables_cache")
+        if cache is not None and cache[0] is template:
+            try:
+                if cache[1] == sources:
+                    return cache[2]
+            except Exception:  # e.g. values replaced by numpy arrays
+                pass
+        variables = {}
+        for source in reversed(sources):
+            variables.update(source)
+        snapshots = [dict(source) for source in sources]
+        self._default_variables_cache = (template, snapshots, variables)
+        return variables
+
+    def __getstate__(self):
+        # The template is sent as its source or path, and compiled again (or
+        # found in the caches) when unpickled. A jinja2.Template provided
+        # directly is kept as is, so the writer can be copied (with the copy
+        # module) but not pickled.
+        state = dict(self.__dict__)
+        state.pop("_default_variables_cache", None)
+        if self._item_template_source is not None:
+            del state["item_template"]
+            return state
+        path = getattr(self.item_template, "filename", None)
+        if path is not None and os.path.isfile(path):
+            del state["item_template"]
+            state["_item_template_path"] = path
+        return state
+
+    def __setstate__(self, state):
+        path = state.pop("_item_template_path", None)
+        self.__dict__.update(state)
+        if "item_template" in state:
+            return
+        if path is None:
+            self.item_template = template_from_string(self._item_template_source)
+        else:
+            environment = get_jinja_environment(self.encoding)
+            self.item_template = environment.get_template(path)
+
+    def __deepcopy__(self, memo):
+        # jinja2 templates can't be copied, but they are never modified, so
+        # the copy shares the template.
+        memo[id(self.item_template)] = self.item_template
+        label_writer = self.__class__.__new__(self.__class__)
+        memo[id(self)] = label_writer
+        state = dict(self.__dict__)
+        state.pop("_default_variables_cache", None)
+        label_writer.__dict__.update(copy.deepcopy(state, memo))
+        return label_writer
+
+    def _is_picklable(self):
+        """Return whether the label writer can be sent to worker processes."""
+        try:
+            pickle.dumps(self)
+        except Exception:  # e.g. a jinja2.Template or lambdas in the context
+            return False
+        return True
+
+    def _pad_records(self, records):
+        """Add empty slots before the records, for partly used sheets.
+
+        The empty slots (None) make the first sheet start at the sheet
+        layout's ``start_position``, while all pages keep the same number of
+        items (so the pages can be rendered separately, cached, etc.).
+        """
+        if self.sheet is None or not self.sheet.start_position:
+            return records
+        empty_slots = [None] * self.sheet.start_position
+        if isinstance(records, (list, tuple, columnar.ColumnarRecords)):
+            return empty_slots + list(records)
+        return itertools.chain(empty_slots, records)
+
+    def _pages_html(self, pages):
+        """Return the HTML document of pages given as lists of items HTMLs."""
+        if self.sheet is None:
+            return get_print_template().render(items_chunks=pages)
+        return get_sheet_template().render(
+            items_chunks=pages,
+            positions=self._sheet_positions,
+            sheet_css=self._sheet_css,
+        )
+
+    def _template_source(self):
+        """Return the source of the item template, or None if unknown."""
+        if self._item_template_source is not None:
+            return self._item_template_source
+        filename = getattr(self.item_template, "filename", None)
+        if filename is not None and os.path.isfile(filename):
+            with open(filename, "r", encoding=self.encoding) as f:
+                return f.read()
+        return None
+
+    def template_variables(self):
+        """Return the names of the variables the records must provide.
+
+        These are the variables used in the item template which are not
+        defined by blabel or the default context. Returns None if the source
+        of the template is unknown (template given as a jinja2.Template).
+        """
+        source = self._template_source()
+        if source is None:
+            return None
+        provided = set(GLOBALS).union(self.default_context)
+        return set(_undeclared_variables(source)).difference(provided)
+
+    def _record_error(self, record, variables=None):
+        """Return why a record can't be turned into a label, or None."""
+        if variables:
+            missing = sorted(variables.difference(record))
+            if missing:
+                return "missing variable(s) %s" % ", ".join(missing)
+        try:
+            self.record_to_html(record)
+        except Exception as error:
+            return "%s: %s" % (type(error).__name__, error)
+        return None
+
+    def validate_records(self, records, check_variables=True, workers=1, chunksize=200):
+        """Check that all records can be turned into labels, before rendering.
+
+        Each record is converted to HTML with the code generators of
+        ``label_tools`` in validation mode (see
+        ``label_tools.validation_mode``), where they only check that the
+        data can be encoded, which is much faster than generating the codes.
+        Raises a ``RecordValidationError`` listing all the invalid records.
+
+        Parameters
+        ----------
+
+        records
+          List of dictionaries with the parameters of each label to print,
+          or a table of records (pandas DataFrame, Arrow table, dict of
+          columns, see ``blabel.columnar``).
+
+        check_variables
+          If True, records lacking a variable used in the item template (see
+          ``template_variables``) are also reported as invalid. Set to False
+          for templates with optional variables.
+
+        workers, chunksize
+          Number of processes checking the records (None for as many as
+          there are CPUs), and number of records sent to a process at once.
+          Label writers which can't be pickled (e.g. with a jinja2.Template
+          or lambdas in their context) check the records in this process.
+        """
+        records = columnar.as_records(records)
+        variables = self.template_variables() if check_variables else None
+        if workers is None:
+            workers = os.cpu_count()
+        if workers == 1 or not self._is_picklable():
+            errors = _records_errors(self, enumerate(records), variables)
+        else:
+            function = partial(_records_errors, self, variables=variables)
+            errors = []
+            for chunk_errors in _map_chunks(
+                function, enumerate(records), workers, chunksize
+            ):
+                errors.extend(chunk_errors)
+        if errors:
+            raise RecordValidationError(errors)
+
+    def _items_htmls(self, records, workers=1, chunksize=200, executor=None):
+        """Return the list of the HTMLs of the records' items.
+
+        The time taken by each record is added to the current stats, if any.
+        With several workers, the records are converted in chunks in worker
+        processes (of the executor, if provided).
+        """
+        stats = profiling.current_stats()
+        if workers is None:
+            workers = os.cpu_count()
+        if workers > 1:
+            function = partial(
+                _items_htmls_chunk, self, collect_stats=stats is not None
+            )
+            items_htmls = []
+            for chunk_htmls, chunk_stats in _map_chunks(
+                function, records, workers, chunksize, executor=executor
+            ):
+                items_htmls.extend(chunk_htmls)
+                if chunk_stats is not None:
+                    # Indices of the records follow those already converted.
+                    index_offset = stats.counts.get("record_to_html", 0)
+                    stats.merge(chunk_stats, index_offset=index_offset)
+            return items_htmls
+        default_variables = self._default_variables()
+        if stats is None:
+            return [
+                "" if record is None else self._render_record(record, default_variables)
+                for record in records
+            ]
+        items_htmls = []
+        index = stats.counts.get("record_to_html", 0)
+        for record in records:
+            if record is None:  # empty slot of a sheet, see _pad_records
+                items_htmls.append("")
+                continue
+            t0 = time.perf_counter()
+            items_htmls.append(self._render_record(record, default_variables))
+            stats.add_record(index, record, time.perf_counter() - t0)
+            index += 1
+        return items_htmls
+
+    def records_to_html(
+        self, records, target=None, stats=None, workers=1, chunksize=200
+    ):
         """Build the full HTML document to be printed.
-        
+
         If ``target`` is None, the raw HTML string is returned, else the HTML
-        is written at the path specified by ``target``."""
-        items_htmls = [self.record_to_html(record) for record in records]
-        items_chunks = tools.list_chunks(items_htmls, self.items_per_page)
-        html = PRINT_TEMPLATE.render(items_chunks=items_chunks)
+        is written at the path specified by ``target``. Timings can be
+        collected by providing a ``profiling.RenderStats`` as ``stats``.
+
+        With ``workers`` > 1 (or None for as many as there are CPUs), the
+        records are converted to HTML in a pool of processes, in chunks of
+        ``chunksize`` records, which speeds up templates generating many
+        codes. The label writer must then be picklable."""
+        if stats is not None:
+            with stats.activate():
+                return self.records_to_html(
+                    records, target=target, workers=workers, chunksize=chunksize
+                )
+        stats = profiling.current_stats()
+        records = self._pad_records(columnar.as_records(records))
+        items_htmls = self._items_htmls(records, workers=workers, chunksize=chunksize)
+        with profiling.measure("records_to_html"):
+            items_chunks = tools.list_chunks(items_htmls, self.items_per_page)
+            html = self._pages_html(items_chunks)
+        if stats is not None:
+            stats.add_size("html", len(html))
         if target is not None:
             with open(target, "w") as f:
                 f.write(html)
         else:
             return html
 
-    def write_labels(self, records, target=None, extra_stylesheets=(), base_url=None):
+    def _document_html(self, records, dedupe_images=True, workers=1, executor=None):
+        """Return the ``(html, resources)`` of the document for the records.
+
+        With several workers, the items HTMLs are generated by the processes
+        of the executor (see ``_items_htmls``).
+        """
+        items_htmls = self._items_htmls(records, workers=workers, executor=executor)
+        pages = tools.list_chunks(items_htmls, self.items_per_page)
+        return self._pages_document(pages, dedupe_images)
+
+    def _pages_document(self, pages, dedupe_images=True):
+        """Return the ``(html, resources)`` of a document with the given pages.
+
+        ``pages`` is a list of lists of items HTMLs.
+        """
+        with profiling.measure("records_to_html"):
+            html = self._pages_html(pages)
+        stats = profiling.current_stats()
+        if stats is not None:
+            stats.add_size("html", len(html))
+        if not dedupe_images:
+            return html, None
+        with profiling.measure("dedupe_images"):
+            return tools.hoist_data_uris(html)
+
+    def _render_pages(
+        self, pages, stylesheets, base_url, dedupe_images, executor=None, workers=1
+    ):
+        """Return a list with the PDF data of each of the given pages.
+
+        The pages are rendered together (in one document per worker of the
+        executor, if any) and the resulting PDF is split into pages. A page
+        whose items overflow on several pages is rendered separately.
+        """
+        chunks = tools.list_chunks(pages, -(-len(pages) // workers))
+        documents = [self._pages_document(chunk, dedupe_images) for chunk in chunks]
+        render = partial(_render_pdf_shard, base_url=base_url, stylesheets=stylesheets)
+        stats = profiling.current_stats()
+        if executor is None:
+            pdfs = map(render, documents)
+        elif stats is None:
+            pdfs = executor.map(render, documents)
+        else:
+            pdfs = executor.map(partial(render, collect_stats=True), documents)
+            pdfs = _collect_shard_stats(pdfs, stats)
+        pages_pdfs = []
+        for chunk, pdf_data in zip(chunks, pdfs):
+            with profiling.measure("split_pages"):
+                chunk_pages_pdfs = tools.split_pdf_pages(pdf_data)
+            if len(chunk_pages_pdfs) != len(chunk):
+                chunk_pages_pdfs = [
+                    render(self._pages_document([page], dedupe_images))
+                    for page in chunk
+                ]
+            pages_pdfs.extend(chunk_pages_pdfs)
+        return pages_pdfs
+
+    def _cached_pages(
+        self,
+        records,
+        page_cache,
+        stylesheets,
+        base_url,
+        workers,
+        pages_per_batch,
+        dedupe_images,
+    ):
+        """Yield the PDF data of each page, only rendering uncached pages."""
+        stylesheets_key = _stylesheets_key(stylesheets)
+        if pages_per_batch is None:
+            batches = [records]
+        else:
+            batches = tools.iter_chunks(records, pages_per_batch * self.items_per_page)
+        from concurrent.futures import ProcessPoolExecutor
+
+        executor = None if workers == 1 else ProcessPoolExecutor(workers)
+        html_workers = workers if workers > 1 and self._is_picklable() else 1
+        try:
+            for batch in batches:
+                items_htmls = self._items_htmls(
+                    batch, workers=html_workers, executor=executor
+                )
+                pages = tools.list_chunks(items_htmls, self.items_per_page)
+                keys = [
+                    _page_key(self._layout_key, stylesheets_key, base_url, page)
+                    for page in pages
+                ]
+                pages_pdfs, missing_pages = {}, {}
+                for key, page in zip(keys, pages):
+                    pdf_data = page_cache.get(key)
+                    if pdf_data is None:
+                        missing_pages[key] = page
+                    else:
+                        pages_pdfs[key] = pdf_data
+                if missing_pages:
+                    rendered_pdfs = self._render_pages(
+                        list(missing_pages.values()),
+                        stylesheets=stylesheets,
+                        base_url=base_url,
+                        dedupe_images=dedupe_images,
+                        executor=executor,
+                        workers=workers,
+                    )
+                    for key, pdf_data in zip(missing_pages, rendered_pdfs):
+                        page_cache.set(key, pdf_data)
+                        pages_pdfs[key] = pdf_data
+                for key in keys:
+                    yield pages_pdfs[key]
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+    def preview_pages(
+        self, records, pages=(0,), resolution=96, extra_stylesheets=(), base_url=None
+    ):
+        """Return PNG previews of some pages of the labels' PDF.
+
+        Only the records of the requested pages are rendered, and the
+        previews are cached (in ``preview.PREVIEW_CACHE``) by the content of
+        the page (i.e. of its items' HTML, which depends on the records, the
+        template and the context), the stylesheets, the base URL and the
+        resolution, so previewing the first page of a large job, or the same
+        page again, is fast. Previews are not cached when some stylesheets
+        are given as ``weasyprint.CSS`` objects. Requires the pypdfium2
+        library.
+
+        Parameters
+        ----------
+
+        records
+          List of dictionaries with the parameters of each label to print,
+          or a table of records (pandas DataFrame, Arrow table, dict of
+          columns, see ``blabel.columnar``).
+
+        pages
+          Indices of the pages to preview (0 for the first page).
+
+        resolution
+          Resolution of the previews in pixels per inch.
+
+        extra_stylesheets, base_url
+          Same as in ``write_labels``.
+
+        Returns
+        -------
+
+        png_images
+          A list with the PNG data (bytes) of each requested page.
+        """
+        from . import preview
+
+        stylesheets = self.default_stylesheets + extra_stylesheets
+        base_url = base_url if base_url else self.default_base_url
+        stylesheets_key = _stylesheets_key(stylesheets)
+        records = self._pad_records(columnar.as_records(records))
+        n_items = self.items_per_page
+        keys, pngs, missing_pages = [], {}, {}
+        for page_index in pages:
+            page_records = records[page_index * n_items : (page_index + 1) * n_items]
+            if page_index < 0 or not page_records:
+                raise IndexError("There is no page %d in the records." % page_index)
+            page = self._items_htmls(page_records)
+            if stylesheets_key is None:  # The page can't be identified.
+                key = len(keys)
+            else:
+                page_key = _page_key(self._layout_key, stylesheets_key, base_url, page)
+                key = (page_key, resolution)
+            keys.append(key)
+            if key not in pngs and key not in missing_pages:
+                png_data = None
+                if stylesheets_key is not None:
+                    png_data = preview.PREVIEW_CACHE.get(key)
+                if png_data is None:
+                    missing_pages[key] = page
+                else:
+                    pngs[key] = png_data
+        if missing_pages:
+            pages_pdfs = self._render_pages(
+                list(missing_pages.values()), stylesheets, base_url, dedupe_images=True
+            )
+            for key, pdf_data in zip(missing_pages, pages_pdfs):
+                with profiling.measure("preview"):
+                    png_data = preview.pdf_page_to_png(pdf_data, resolution=resolution)
+                if stylesheets_key is not None:
+                    preview.PREVIEW_CACHE.set(key, png_data)
+                pngs[key] = png_data
+        return [pngs[key] for key in keys]
+
+    def write_labels(
+        self,
+        records,
+        target=None,
+        extra_stylesheets=(),
+        base_url=None,
+        workers=1,
+        pages_per_batch=None,
+        stats=None,
+        dedupe_images=True,
+        page_cache=None,
+        validate=False,
+    ):
         """Write the PDF document containing the labels to be printed.
-        
+
         Parameters
         ----------
 
         records
-          List of dictionaries with the parameters of each label to print.
-        
+          List (or any iterable, e.g. a generator, when ``pages_per_batch``
+          is provided) of dictionaries with the parameters of each label to
+          print, or a table of records (pandas DataFrame, Arrow table, dict
+          of columns) whose rows are read without conversion to dicts (see
+          ``blabel.columnar``).
+
         target
-          Path of the PDF file to be generated. If left to None or "@memory",
-          the raw file data will be returned.
-        
+          Path of the PDF file to be generated, or a writable stream (e.g. a
+          socket file or HTTP response) to which the PDF is written as it is
+          produced. If left to None or "@memory", the raw file data will be
+          returned. If "@memoryview", a memoryview of the PDF data is
+          returned, avoiding a full copy of large PDFs.
+
         extra_stylesheets
           List of path to stylesheets of Weasyprint CSS objects to complement
           the default stylesheets.
@@ -157,10 +945,206 @@ class LabelWriter:
         base_url
           Path of the origin for the different relative path inside the HTML
           document getting printed.
+
+        workers
+          Number of processes used to render the PDF. With more than one
+          worker, the records are split into shards of whole pages (see
+          ``items_per_page``), each shard is rendered in a separate process,
+          and the shards are merged into one PDF with the pages in the
+          original order. Use None for as many workers as there are CPUs.
+          The stylesheets must then be given as paths rather than
+          ``weasyprint.CSS`` objects, as they are sent to the workers.
+
+        pages_per_batch
+          If provided, the records are consumed lazily and rendered in
+          batches of this many pages, the pages of each batch being written
+          to the target as soon as the batch is rendered (see
+          ``tools.merge_pdfs``). The HTML document, WeasyPrint layout and PDF
+          objects then never hold more than one batch per worker, so very
+          large jobs, or generators of records, can be printed to a file or
+          stream with a bounded memory footprint (with ``target=None`` the
+          final PDF itself is returned, so it is in memory).
+
+        stats
+          A ``profiling.RenderStats`` object in which to record the time spent
+          in each stage of the rendering (including in worker processes),
+          the sizes of the HTML and images produced, and the slowest records.
+
+        validate
+          If True, all records are first checked with ``validate_records``,
+          so that every invalid record is reported (with a
+          ``RecordValidationError``) before any label is rendered. The
+          records are then all loaded in memory.
+
+        page_cache
+          A ``caching.LRUCache`` (or any object with ``get(key)`` and
+          ``set(key, value)`` methods) in which the PDF of each page is kept.
+          When the same cache is used for successive renders, only the pages
+          whose content changed (the HTML of their items, which depends on
+          the records, the template and the context, or the stylesheets,
+          base URL, sheet layout and blabel version) are laid out again, the
+          other pages being reused as-is. Use a ``caching.DiskCache`` (e.g.
+          with a ``max_size``) to reuse the pages across runs, for reprints.
+          The cache is not used when some stylesheets are given as
+          ``weasyprint.CSS`` objects rather than paths, as their content
+          can't be identified.
+
+        dedupe_images
+          If True, identical images given as data URIs (logos, codes repeated
+          on several labels, etc.) are hoisted out of the HTML and loaded and
+          embedded in the PDF only once (see ``tools.hoist_data_uris``).
         """
-        return write_pdf(
-            self.records_to_html(records),
-            target=target,
-            extra_stylesheets=self.default_stylesheets + extra_stylesheets,
-            base_url=base_url if base_url else self.default_base_url,
-        )
+        if stats is not None:
+            with stats.activate(), profiling.measure("write_labels"):
+                pdf_data = self.write_labels(
+                    records,
+                    target=target,
+                    extra_stylesheets=extra_stylesheets,
+                    base_url=base_url,
+                    workers=workers,
+                    pages_per_batch=pages_per_batch,
+                    dedupe_images=dedupe_images,
+                    page_cache=page_cache,
+                    validate=validate,
+                )
+            if pdf_data is not None:
+                stats.add_size("pdf", len(pdf_data))
+            return pdf_data
+        if workers is None:
+            workers = os.cpu_count()
+        records = columnar.as_records(records)
+        if validate:
+            if not isinstance(records, columnar.ColumnarRecords):
+                records = list(records)
+            with profiling.measure("validate"):
+                self.validate_records(records, workers=workers)
+        records = self._pad_records(records)
+        stylesheets = self.default_stylesheets + extra_stylesheets
+        base_url = base_url if base_url else self.default_base_url
+        if page_cache is not None and _stylesheets_key(stylesheets) is not None:
+            pages_pdfs = self._cached_pages(
+                records,
+                page_cache,
+                stylesheets=stylesheets,
+                base_url=base_url,
+                workers=workers,
+                pages_per_batch=pages_per_batch,
+                dedupe_images=dedupe_images,
+            )
+            return tools.merge_pdfs(pages_pdfs, target=target)
+        if pages_per_batch is None:
+            if workers == 1:
+                html, resources = self._document_html(records, dedupe_images)
+                return write_pdf(
+                    html,
+                    target=target,
+                    extra_stylesheets=stylesheets,
+                    base_url=base_url,
+                    resources=resources,
+                )
+            if not isinstance(records, columnar.ColumnarRecords):
+                records = list(records)
+            batches = tools.page_aligned_chunks(records, self.items_per_page, workers)
+        else:
+            batch_size = pages_per_batch * self.items_per_page
+            batches = tools.iter_chunks(records, batch_size)
+        render = partial(_render_pdf_shard, base_url=base_url, stylesheets=stylesheets)
+        if workers == 1:
+            documents = (self._document_html(batch, dedupe_images) for batch in batches)
+            return tools.merge_pdfs(map(render, documents), target=target)
+        stats = profiling.current_stats()
+        if stats is not None:
+            render = partial(render, collect_stats=True)
+        # The items HTMLs are also generated by the workers, unless the label
+        # writer can't be sent to them.
+        html_workers = workers if self._is_picklable() else 1
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(workers) as executor:
+            documents = (
+                self._document_html(batch, dedupe_images, html_workers, executor)
+                for batch in batches
+            )
+            pdfs = tools.imap_bounded(executor, render, documents, 2 * workers)
+            if stats is not None:
+                pdfs = _collect_shard_stats(pdfs, stats)
+            return tools.merge_pdfs(pdfs, target=target)
+
+    def _stamp_background(self, items_htmls, stylesheets, base_url):
+        """Lay out one page of items with their stamped fields hidden.
+
+        Returns the PDF data of the page and the stamped boxes in the page.
+        """
+        from weasyprint import HTML
+
+        from . import stamping
+
+        html = self._pages_html([items_htmls])
+        stylesheets = load_stylesheets(stylesheets)
+        stylesheets.append(_hide_stamped_fields_stylesheet())
+        with profiling.measure("layout"):
+            document = HTML(string=html, base_url=base_url).render(
+                stylesheets=stylesheets, font_config=get_font_config()
+            )
+        if len(document.pages) != 1:
+            raise ValueError(
+                "A page of %d labels was laid out on %d pages, but stamped labels "
+                "require each page of items to fit in one page."
+                % (len(items_htmls), len(document.pages))
+            )
+        boxes = stamping.find_stamped_boxes(document.pages[0])
+        with profiling.measure("pdf_write"):
+            pdf_data = document.write_pdf()
+        return pdf_data, boxes
+
+    def write_stamped_labels(
+        self, records, target=None, extra_stylesheets=(), base_url=None
+    ):
+        """Write the labels quickly by stamping their variable fields.
+
+        This is a fast alternative to ``write_labels`` for large runs of
+        labels with the same layout. The elements of the item template whose
+        content varies from label to label must be marked with a
+        ``data-stamp`` attribute: WeasyPrint lays out only the first page
+        (with these elements hidden) and the variable texts and images of
+        every label are then drawn directly in the PDF. See
+        ``blabel.stamping`` for the details and limitations. In particular,
+        stamped texts are drawn in Helvetica with the cp1252 encoding, so
+        characters outside of cp1252 (e.g. non-Latin scripts) become "?".
+
+        The parameters are the same as in ``write_labels``.
+        """
+        from . import stamping
+
+        stylesheets = self.default_stylesheets + extra_stylesheets
+        base_url = base_url if base_url else self.default_base_url
+        records = columnar.as_records(records)
+        items_htmls = self._items_htmls(self._pad_records(records))
+        backgrounds = {}
+
+        def stamped_pages():
+            for page_number, page_items in enumerate(
+                tools.list_chunks(items_htmls, self.items_per_page)
+            ):
+                # Pages with the same filled slots share the same background.
+                slots = tuple(bool(item_html) for item_html in page_items)
+                if slots not in backgrounds:
+                    backgrounds[slots] = self._stamp_background(
+                        page_items, stylesheets, base_url
+                    )
+                background_pdf, boxes = backgrounds[slots]
+                fields = [
+                    field
+                    for item_html in page_items
+                    for field in stamping.parse_stamped_fields(item_html)
+                ]
+                if len(fields) != len(boxes):
+                    raise ValueError(
+                        "Page %d has %d stamped fields but the laid out page has "
+                        "%d. All labels must have the same stamped elements."
+                        % (page_number + 1, len(fields), len(boxes))
+                    )
+                yield background_pdf, boxes, fields
+
+        with profiling.measure("stamp"):
+            return stamping.stamp_pages(stamped_pages(), target, base_url=base_url)
@@ -0,0 +1,221 @@
+"""Caches used to avoid computing the same label elements several times."""
+
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+def hash_key(key):
+    """Return a hexadecimal SHA-256 digest identifying a cache key.
+
+    The key is hashed via its ``repr``, so it should be made of strings,
+    numbers, and tuples thereof (dicts should be converted to sorted tuples).
+    """
+    return hashlib.sha256(repr(key).encode("utf-8")).hexdigest()
+
+
+class DiskCache:
+    """Persistent cache storing each value in a file of a directory.
+
+    Parameters
+    ----------
+
+    directory
+      Path to the folder in which the values are stored. It is created if it
+      does not exist. Several processes can safely share the same directory.
+
+    encoding
+      If None, the cached values must be bytes. Otherwise, the values are
+      strings which are stored with this encoding (e.g. "utf-8").
+
+    max_size
+      Maximal total size of the stored values, in bytes (None for no limit).
+      When a value written by this process brings the cache over this size,
+      the least recently used values are removed until the cache is back to
+      90% of the size (so that the directory is not scanned at every
+      write). Values are marked as used when they are read.
+
+    Examples
+    --------
+
+    >>> # Keep up to 2GB of rendered pages across runs, for reprints:
+    >>> page_cache = DiskCache("~/.cache/blabel/pages", max_size=2e9)
+    >>> label_writer.write_labels(records, "labels.pdf", page_cache=page_cache)
+    """
+
+    def __init__(self, directory, encoding=None, max_size=None):
+        self.directory = os.path.expanduser(directory)
+        self.encoding = encoding
+        self.max_size = max_size
+        self._size = None  # estimate of the size, computed on first write
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key):
+        digest = hash_key(key)
+        return os.path.join(self.directory, digest[:2], digest[2:])
+
+    def get(self, key, default=None):
+        """Return the value stored for the key, or the default."""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = f.read()
+            if self.max_size is not None:
+                os.utime(path)  # Mark the value as recently used.
+        except OSError:
+            return default
+        if self.encoding is not None:
+            value = value.decode(self.encoding)
+        return value
+
+    def set(self, key, value):
+        """Store a value for the key (replacing any previous value)."""
+        if self.encoding is not None:
+            value = value.encode(self.encoding)
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write in a temporary file then rename it, so that concurrent readers
+        # never see a partially written file.
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(value)
+        os.replace(temp_path, path)
+        if self.max_size is not None:
+            if self._size is None:
+                self._size = self.size()
+            else:
+                self._size += len(value)
+            if self._size > self.max_size:
+                self.evict(0.9 * self.max_size)
+
+    def _files(self):
+        """Return a list of ``(last_use_time, size, path)`` of the files."""
+        files = []
+        for folder, _, filenames in os.walk(self.directory):
+            for filename in filenames:
+                path = os.path.join(folder, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:  # removed by another process
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    def size(self):
+        """Return the total size of the stored values, in bytes."""
+        return sum(size for _, size, _ in self._files())
+
+    def evict(self, max_size):
+        """Remove the least recently used values, down to max_size bytes."""
+        files = sorted(self._files())
+        total = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if total <= max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:  # removed by another process
+                pass
+            total -= size
+        self._size = total
+
+    def clear(self):
+        """Remove all values from the cache directory."""
+        for folder, _, filenames in os.walk(self.directory):
+            for filename in filenames:
+                os.remove(os.path.join(folder, filename))
+        self._size = 0
+
+
+class LRUCache:
+    """Bounded in-memory cache evicting the least recently used values.
+
+    Parameters
+    ----------
+
+    maxsize
+      Maximal number of values kept in memory. Set to 0 to disable the
+      in-memory tier.
+
+    disk_cache
+      Optional ``DiskCache`` used as a persistent second tier: values missing
+      in memory are looked up on disk before being computed, and computed
+      values are written to both tiers.
+
+    Examples
+    --------
+
+    >>> cache = LRUCache(maxsize=100)
+    >>> value = cache.get_or_compute(("square", 3), lambda: 3 ** 2)
+    >>> cache.stats()
+    {'hits': 0, 'disk_hits': 0, 'misses': 1, 'size': 1, 'maxsize': 100}
+    """
+
+    def __init__(self, maxsize=1024, disk_cache=None):
+        self.maxsize = maxsize
+        self.disk_cache = disk_cache
+        self._values = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.disk_hits = self.misses = 0
+
+    def get(self, key, default=None):
+        """Return the value cached for the key, or the default."""
+        with self._lock:
+            if key in self._values:
+                self._values.move_to_end(key)
+                self.hits += 1
+                return self._values[key]
+        if self.disk_cache is not None:
+            value = self.disk_cache.get(key)
+            if value is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                self._store(key, value)
+                return value
+        with self._lock:
+            self.misses += 1
+        return default
+
+    def _store(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._values[key] = value
+            self._values.move_to_end(key)
+            while len(self._values) > self.maxsize:
+                self._values.popitem(last=False)
+
+    def set(self, key, value):
+        """Cache the value for the key, in memory and on disk."""
+        self._store(key, value)
+        if self.disk_cache is not None:
+            self.disk_cache.set(key, value)
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for the key, computing it on a miss.
+
+        ``compute`` is a function without arguments returning the value.
+        """
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def clear(self):
+        """Empty the in-memory tier and reset the statistics."""
+        with self._lock:
+            self._values.clear()
+            self.hits = self.disk_hits = self.misses = 0
+
+    def stats(self):
+        """Return a dict of hit/miss statistics and current size."""
+        return dict(
+            hits=self.hits,
+            disk_hits=self.disk_hits,
+            misses=self.misses,
+            size=len(self._values),
+            maxsize=self.maxsize,
+        )
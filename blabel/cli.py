@@ -0,0 +1,198 @@
+"""Command-line interface of blabel (``blabel --help`` for usage)."""
+
+import argparse
+import os
+import sys
+
+from . import tools
+from .sheets import SHEETS
+
+
+def _add_writer_arguments(parser):
+    parser.add_argument("template", help="Path to the HTML/jinja2 item template.")
+    parser.add_argument(
+        "-s",
+        "--stylesheet",
+        action="append",
+        default=[],
+        dest="stylesheets",
+        help="Path to a CSS stylesheet (can be repeated).",
+    )
+    parser.add_argument(
+        "--items-per-page", type=int, default=1, help="Number of items per page."
+    )
+    parser.add_argument(
+        "--base-url", help="Origin of the relative paths in the template."
+    )
+    parser.add_argument("--encoding", help="Encoding of the template file.")
+    parser.add_argument(
+        "--sheet",
+        choices=sorted(SHEETS),
+        help="Print on sheets of labels of this type (sets the items per page).",
+    )
+    parser.add_argument(
+        "--sheet-start",
+        type=int,
+        default=0,
+        help="Position of the first label to use on the first sheet.",
+    )
+
+
+def _writer_params(args):
+    return dict(
+        item_template_path=args.template,
+        default_stylesheets=tuple(args.stylesheets),
+        default_base_url=args.base_url,
+        items_per_page=args.items_per_page,
+        encoding=args.encoding,
+        sheet=(
+            None
+            if args.sheet is None
+            else SHEETS[args.sheet].starting_at(args.sheet_start)
+        ),
+    )
+
+
+def render(args):
+    from .blabel import LabelWriter, RecordValidationError
+
+    fmt = args.format
+    if fmt is None:
+        extension = os.path.splitext(args.records)[1].lower().lstrip(".")
+        fmt = {"json": "jsonl", "txt": "tsv"}.get(extension, extension or "csv")
+    if args.records == "-":
+        records_file = sys.stdin
+    else:
+        records_file = open(args.records, "r", newline="", encoding="utf-8")
+    with records_file:
+        records = tools.read_records(records_file, fmt=fmt)
+        label_writer = LabelWriter(**_writer_params(args))
+        kwargs = dict(
+            workers=args.workers,
+            pages_per_batch=args.batch_size,
+            validate=args.validate,
+        )
+        if args.page_cache is not None:
+            from .caching import DiskCache
+
+            max_size = args.page_cache_size
+            if max_size is not None:
+                max_size = max_size * 1e6
+            kwargs["page_cache"] = DiskCache(args.page_cache, max_size=max_size)
+        target = sys.stdout.buffer if args.output == "-" else args.output
+        try:
+            label_writer.write_labels(records, target=target, **kwargs)
+        except RecordValidationError as error:
+            sys.exit("blabel: %s" % error)
+
+
+def serve(args):
+    from .server import LabelServer
+
+    address = args.socket if args.port is None else (args.host, args.port)
+    warmup_record = None
+    if args.warmup_record is not None:
+        import json
+
+        warmup_record = json.loads(args.warmup_record)
+    server = LabelServer(
+        address,
+        workers=args.workers,
+        warmup_record=warmup_record,
+        **_writer_params(args)
+    )
+    print("Serving labels on %s" % (address,))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="blabel", description="Generate multi-page, multi-label PDFs."
+    )
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.required = True
+
+    render_parser = subparsers.add_parser(
+        "render",
+        help="Render labels from a CSV, TSV or JSON Lines file.",
+        description="Render one label per record of a CSV/TSV file (one "
+        "column per template variable) or JSON Lines file.",
+    )
+    _add_writer_arguments(render_parser)
+    render_parser.add_argument(
+        "records",
+        nargs="?",
+        default="-",
+        help="Path to the records file, or - (default) to read stdin.",
+    )
+    render_parser.add_argument(
+        "-f",
+        "--format",
+        choices=["csv", "tsv", "jsonl"],
+        help="Format of the records (default: from the file extension, "
+        "csv for stdin).",
+    )
+    render_parser.add_argument(
+        "-o",
+        "--output",
+        default="labels.pdf",
+        help="Path of the PDF to generate, or - for stdout.",
+    )
+    render_parser.add_argument(
+        "--workers", type=int, default=1, help="Number of rendering processes."
+    )
+    render_parser.add_argument(
+        "--batch-size",
+        type=int,
+        help="Stream the records and render them this many pages at a time.",
+    )
+    render_parser.add_argument(
+        "--validate",
+        action="store_true",
+        help="Check all records before rendering, and report every invalid one.",
+    )
+    render_parser.add_argument(
+        "--page-cache",
+        metavar="DIRECTORY",
+        help="Keep the rendered pages in this folder, and reuse them in later "
+        "renders (e.g. reprints) instead of rendering them again.",
+    )
+    render_parser.add_argument(
+        "--page-cache-size",
+        type=float,
+        help="Maximal size of the page cache in MB (least recently used pages "
+        "are removed first). Default: no limit.",
+    )
+    render_parser.set_defaults(function=render)
+
+    serve_parser = subparsers.add_parser(
+        "serve",
+        help="Run a rendering server with pre-warmed workers.",
+        description="Render labels for clients of a local socket, see "
+        "blabel.server for the protocol and client.",
+    )
+    _add_writer_arguments(serve_parser)
+    serve_parser.add_argument(
+        "--socket", default="blabel.sock", help="Path of the Unix socket."
+    )
+    serve_parser.add_argument(
+        "--port", type=int, help="Listen on this TCP port instead of a Unix socket."
+    )
+    serve_parser.add_argument(
+        "--host", default="127.0.0.1", help="Host for the TCP socket."
+    )
+    serve_parser.add_argument(
+        "--workers", type=int, default=2, help="Number of worker processes."
+    )
+    serve_parser.add_argument(
+        "--warmup-record",
+        help="JSON record rendered by each worker at startup, e.g. "
+        '\'{"sample_id": "s01"}\'.',
+    )
+    serve_parser.set_defaults(function=serve)
+
+    args = parser.parse_args(argv)
+    args.function(args)
@@ -0,0 +1,174 @@
+"""Records given as columns (pandas DataFrames, Arrow tables, dicts of arrays).
+
+``LabelWriter`` methods accept such tables directly, instead of a list of
+dicts per row (e.g. from ``dataframe.to_dict(orient="records")``):
+
+>>> dataframe = pandas.read_csv("records.csv")
+>>> label_writer.write_labels(dataframe, target="labels.pdf")
+
+The rows are not converted to dicts. Each record is a light read-only view
+on one row of the columns, created as the records are iterated, so large
+tables are printed without one Python dict per label.
+
+The columns are extracted once: numerical columns of pandas and Arrow tables
+are used as numpy arrays (without copy when possible), other columns are
+converted to lists of Python objects (as ``to_dict`` would do).
+
+pandas, pyarrow and numpy are not dependencies of blabel: tables are
+recognized by their attributes, without importing these libraries.
+"""
+
+from collections.abc import Mapping, Sequence
+
+
+class RecordView(Mapping):
+    """Read-only view of one row of the columns, used as a record.
+
+    It pickles as a plain dict (so sending records to worker processes
+    doesn't send the full columns).
+    """
+
+    __slots__ = ("_columns", "_index")
+
+    def __init__(self, columns, index):
+        self._columns = columns
+        self._index = index
+
+    def __getitem__(self, key):
+        return self._columns[key][self._index]
+
+    def __contains__(self, key):
+        return key in self._columns
+
+    def __iter__(self):
+        return iter(self._columns)
+
+    def __len__(self):
+        return len(self._columns)
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+    def __repr__(self):
+        return "RecordView(%r)" % dict(self)
+
+
+class ColumnarRecords(Sequence):
+    """Sequence of records stored as columns.
+
+    Parameters
+    ----------
+
+    columns
+      Dict ``{variable_name: values}`` where all values are sequences (lists,
+      numpy arrays...) of the same length, with one element per record.
+
+    Slicing returns ColumnarRecords on slices of the columns (views of numpy
+    arrays), so batches and pages of records are cheap to create.
+    """
+
+    def __init__(self, columns):
+        self.columns = dict(columns)
+        lengths = set(len(values) for values in self.columns.values())
+        if len(lengths) > 1:
+            raise ValueError(
+                "All columns should have the same length, got lengths %s"
+                % ", ".join(str(length) for length in sorted(lengths))
+            )
+        self._length = lengths.pop() if lengths else 0
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return ColumnarRecords(
+                {name: values[index] for name, values in self.columns.items()}
+            )
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("Record index out of range.")
+        return RecordView(self.columns, index)
+
+    def __iter__(self):
+        columns = self.columns
+        for index in range(self._length):
+            yield RecordView(columns, index)
+
+    def __repr__(self):
+        return "ColumnarRecords(%d records, columns=%s)" % (
+            self._length,
+            list(self.columns),
+        )
+
+
+def _pandas_column(series):
+    if series.dtype.kind in "biuf":
+        return series.to_numpy()
+    return series.tolist()
+
+
+def _arrow_column(column):
+    import pyarrow.types
+
+    numerical = (
+        pyarrow.types.is_integer(column.type)
+        or pyarrow.types.is_floating(column.type)
+        or pyarrow.types.is_boolean(column.type)
+    )
+    if numerical and column.null_count == 0:
+        return column.to_numpy()
+    return column.to_pylist()
+
+
+def _is_column(values):
+    """Return whether the values are a column (a non-string sequence or array)."""
+    if isinstance(values, (str, bytes, Mapping)):
+        return False
+    if not hasattr(values, "__getitem__"):
+        return False
+    try:
+        len(values)
+    except TypeError:  # e.g. 0-dimensional numpy arrays
+        return False
+    return True
+
+
+def as_records(records):
+    """Return columnar records as ColumnarRecords, other records unchanged.
+
+    Recognized columnar records are ColumnarRecords, pandas DataFrames,
+    Arrow tables and record batches, and dicts of columns (any other
+    iterable is assumed to be an iterable of records). Raises a ValueError
+    for dicts with values which are not columns (strings, numbers...), such
+    as a single record given instead of a list of records.
+    """
+    if isinstance(records, ColumnarRecords):
+        return records
+    if hasattr(records, "iloc") and hasattr(records, "columns"):  # DataFrame
+        return ColumnarRecords(
+            {name: _pandas_column(records[name]) for name in records.columns}
+        )
+    if hasattr(records, "column_names") and hasattr(records, "column"):  # Arrow
+        return ColumnarRecords(
+            {name: _arrow_column(records.column(name)) for name in records.column_names}
+        )
+    if isinstance(records, Mapping):
+        not_columns = [
+            name for name, values in records.items() if not _is_column(values)
+        ]
+        if not_columns:
+            raise ValueError(
+                "Records given as a dict should be a dict of columns "
+                "{variable_name: values} where all values are lists or arrays, "
+                "but the values of %s are not. For a single record, use a list "
+                "of one dict." % ", ".join(repr(name) for name in not_columns)
+            )
+        return ColumnarRecords(
+            {
+                name: _pandas_column(values) if hasattr(values, "iloc") else values
+                for name, values in records.items()
+            }
+        )
+    return records
@@ -1,14 +1,141 @@
 """Utilities for label generation.
+
+The symbology libraries (qrcode, python-barcode, pyStrich) and PIL are only
+imported when a code is first generated, so that importing blabel is fast.
 """
 import base64
 from io import BytesIO
 import datetime
+import functools
+import inspect
+import os
 import textwrap
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from . import profiling
+from .caching import DiskCache, LRUCache
+
+#: Cache of the image data generated by ``qr_code``, ``datamatrix`` and
+#: ``barcode``, keyed on the data and all encoding options.
+SYMBOLOGY_CACHE = LRUCache(maxsize=1024)
+
+
+_VALIDATING = ContextVar("blabel_validating", default=False)
+
+#: Image data returned by the symbology generators in validation mode.
+VALIDATION_PLACEHOLDER = "data:,"
+
+
+@contextmanager
+def validation_mode():
+    """Only check that the data can be encoded, in the ``with`` block.
+
+    In validation mode, ``qr_code``, ``datamatrix`` and ``barcode`` raise the
+    same errors as usual for data which can't be encoded (too long, illegal
+    characters, etc.) but don't generate any image, and return
+    ``VALIDATION_PLACEHOLDER`` instead. This is used to validate records
+    cheaply before rendering (see ``LabelWriter.validate_records``).
+    """
+    token = _VALIDATING.set(True)
+    try:
+        yield
+    finally:
+        _VALIDATING.reset(token)
+
+
+def configure_cache(maxsize=1024, cache_dir=None):
+    """Replace the cache of the symbology generators (qr codes, etc.).
+
+    Parameters
+    ----------
+    maxsize
+      Number of images kept in memory (least recently used images are
+      evicted first). Use 0 to disable the in-memory cache.
+
+    cache_dir
+      Optional path to a folder where generated images are also stored, so
+      that they are reused across processes and program runs.
 
-import qrcode
-import barcode as python_barcode
-from pystrich.datamatrix import DataMatrixEncoder
-from PIL import Image, ImageOps
+    Examples:
+    ---------
+
+    >>> configure_cache(maxsize=10000, cache_dir="~/.cache/blabel")
+    >>> ... # generate labels
+    >>> SYMBOLOGY_CACHE.stats()
+    {'hits': 8712, 'disk_hits': 1200, 'misses': 88, 'size': 1288, ...}
+    """
+    global SYMBOLOGY_CACHE
+    disk_cache = None if cache_dir is None else DiskCache(cache_dir, "ascii")
+    SYMBOLOGY_CACHE = LRUCache(maxsize=maxsize, disk_cache=disk_cache)
+
+
+def _typed_value(value):
+    """Return a hashable representation of a value which includes its type.
+
+    Values of different types which compare equal (``1``, ``True``, ``1.0``,
+    ``numpy.float64(1.0)``...) are encoded differently (e.g. as "1", "True"
+    and "1.0"), so they must not share cache keys.
+    """
+    if isinstance(value, dict):
+        items = sorted((key, _typed_value(item)) for key, item in value.items())
+        return ("dict", tuple(items))
+    if isinstance(value, tuple):
+        return ("tuple", tuple(_typed_value(item) for item in value))
+    return (type(value).__name__, value)
+
+
+def _cached(function):
+    """Decorate a symbology generator so its results go through the cache.
+
+    The cache key is made of the function name and of all its parameters
+    (including default values and writer options) with their types. Calls
+    with unhashable parameters are simply not cached.
+    """
+    signature = inspect.signature(function)
+
+    def cache_key(*args, **kwargs):
+        """Return the cache key of a call, or None if it can't be cached."""
+        arguments = signature.bind(*args, **kwargs)
+        arguments.apply_defaults()
+        key = [function.__name__]
+        for name, value in arguments.arguments.items():
+            key.append((name, _typed_value(value)))
+        key = tuple(key)
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    @functools.wraps(function)
+    def cached_function(*args, **kwargs):
+        if _VALIDATING.get():
+            return function(*args, **kwargs)
+        key = cache_key(*args, **kwargs)
+        if key is None:
+            return function(*args, **kwargs)
+        return SYMBOLOGY_CACHE.get_or_compute(key, lambda: function(*args, **kwargs))
+
+    cached_function.cache_key = cache_key
+    return cached_function
+
+
+def _instrumented(function):
+    """Decorate a symbology generator so it reports to the job's stats."""
+    stage = "symbology.%s" % function.__name__
+
+    @functools.wraps(function)
+    def instrumented_function(*args, **kwargs):
+        stats = profiling.current_stats()
+        if stats is None:
+            return function(*args, **kwargs)
+        with profiling.measure(stage):
+            result = function(*args, **kwargs)
+        stats.add_size("images", len(result))
+        return result
+
+    return instrumented_function
 
 
 def now(fmt="%Y-%m-%d %H:%M"):
@@ -42,6 +169,69 @@ def pil_to_html_imgdata(img, fmt="PNG"):
     return prefix + img_str.decode()
 
 
+def svg_to_html_imgdata(svg):
+    """Convert a SVG string into HTML-displayable data.
+
+    The result is a string ``data:image/svg+xml;charset=utf-8;base64,xxxxx``
+    which you can provide as a "src" parameter to a ``<img/>`` tag.
+    """
+    if isinstance(svg, str):
+        svg = svg.encode()
+    prefix = "data:image/svg+xml;charset=utf-8;base64,"
+    return prefix + base64.b64encode(svg).decode()
+
+
+def modules_to_svg(matrix, module_size=1, fill_color="black", back_color="white"):
+    """Return a <svg/> string drawing a 2D code from its matrix of modules.
+
+    Parameters
+    ----------
+    matrix
+      List of rows, each row being a list of booleans (True for dark
+      modules).
+
+    module_size
+      Size of each module in pixels, which determines the width and height
+      of the SVG (the drawing itself is vectorial and scales freely).
+
+    fill_color, back_color
+      Colors of the dark modules and of the background (None for a
+      transparent background).
+    """
+    height, width = len(matrix), len(matrix[0]) if matrix else 0
+    path = []
+    for y, row in enumerate(matrix):
+        x = 0
+        while x < width:
+            if row[x]:
+                start = x
+                while x < width and row[x]:
+                    x += 1
+                path.append("M%d %dh%dv1h-%dz" % (start, y, x - start, x - start))
+            else:
+                x += 1
+    background = ""
+    if back_color is not None:
+        background = '<rect width="%d" height="%d" fill="%s"/>' % (
+            width,
+            height,
+            back_color,
+        )
+    return (
+        '<svg xmlns="http://www.w3.org/2000/svg" version="1.1" width="%d" '
+        'height="%d" viewBox="0 0 %d %d" shape-rendering="crispEdges">'
+        '%s<path fill="%s" d="%s"/></svg>'
+    ) % (
+        width * module_size,
+        height * module_size,
+        width,
+        height,
+        background,
+        fill_color,
+        "".join(path),
+    )
+
+
 def wrap(text, col_width):
     """Breaks the text into lines with at maximum 'col_width' characters."""
     return "\n".join(textwrap.wrap(text, col_width))
@@ -59,12 +249,40 @@ def hiro_square(width="100%"):
         width,
         width,
     )
-    prefix = "data:image/svg+xml;charset=utf-8;base64,"
-    return prefix + base64.b64encode(svg.encode()).decode()
+    return svg_to_html_imgdata(svg)
 
 
-def qr_code(
+def _qr_code_object(data, optimize, qr_code_params):
+    """Return a ``qrcode.QRCode`` with the data added, and its parameters."""
+    import qrcode
+
+    params = dict(box_size=5, border=0)
+    params.update(qr_code_params)
+    qr = qrcode.QRCode(**params)
+    qr.add_data(data, optimize=optimize)
+    return qr, params
+
+
+def qr_code_image(
     data, optimize=20, fill_color="black", back_color="white", **qr_code_params
+):
+    """Return a QR code as a PIL image.
+
+    The parameters are the same as in ``qr_code``.
+    """
+    qr, _ = _qr_code_object(data, optimize, qr_code_params)
+    return qr.make_image(fill_color=fill_color, back_color=back_color).get_image()
+
+
+@_instrumented
+@_cached
+def qr_code(
+    data,
+    optimize=20,
+    fill_color="black",
+    back_color="white",
+    fmt="png",
+    **qr_code_params
 ):
     """Return a QR code's image data.
 
@@ -81,6 +299,11 @@ def qr_code(
     
     fill_color, back_color
       Colors to use for QRcode and its background.
+
+    fmt
+      Either "png" for a raster image, or "svg" for a vectorial image which
+      is faster to generate, lighter in the final PDF, and sharp at any
+      printer resolution.
     
     **qr_code_params
       Parameters of the ``qrcode.QRCode`` constructor, such as ``version``,
@@ -89,8 +312,9 @@ def qr_code(
     Returns
     -------
     image_base64_data
-      A string ``data:image/png;base64,xxxxxxxxx`` which you can provide as a
-      "src" parameter to a ``<img/>`` tag.
+      A string ``data:image/png;base64,xxxxxxxxx`` (or
+      ``data:image/svg+xml;...``) which you can provide as a "src" parameter
+      to a ``<img/>`` tag.
 
     Examples:
     ---------
@@ -98,15 +322,46 @@ def qr_code(
     >>> data = qr_code('egf45728')
     >>> html_data = '<img src="%s"/>' % data
     """
-    params = dict(box_size=5, border=0)
-    params.update(qr_code_params)
-    qr = qrcode.QRCode(**params)
-    qr.add_data(data, optimize=20)
+    qr, params = _qr_code_object(data, optimize, qr_code_params)
+    if _VALIDATING.get():
+        qr.make(fit=True)
+        return VALIDATION_PLACEHOLDER
+    if fmt == "svg":
+        qr.make(fit=True)
+        return svg_to_html_imgdata(
+            modules_to_svg(
+                qr.get_matrix(),
+                module_size=params["box_size"],
+                fill_color=fill_color,
+                back_color=back_color,
+            )
+        )
     qri = qr.make_image(fill_color=fill_color, back_color=back_color)
     return pil_to_html_imgdata(qri.get_image())
 
 
-def datamatrix(data, cellsize=2, with_border=False):
+def _datamatrix_encoder_image(encoder, cellsize, with_border):
+    from PIL import Image, ImageOps
+
+    img = Image.open(BytesIO(encoder.get_imagedata(cellsize=cellsize)))
+    if not with_border:
+        img = img.crop(ImageOps.invert(img).getbbox())
+    return img
+
+
+def datamatrix_image(data, cellsize=2, with_border=False):
+    """Return a datamatrix as a PIL image.
+
+    The parameters are the same as in ``datamatrix``.
+    """
+    from pystrich.datamatrix import DataMatrixEncoder
+
+    return _datamatrix_encoder_image(DataMatrixEncoder(data), cellsize, with_border)
+
+
+@_instrumented
+@_cached
+def datamatrix(data, cellsize=2, with_border=False, fmt="png"):
     """Return a datamatrix's image data.
 
     Powered by the Python library ``pyStrich``. See this library's documentation
@@ -123,11 +378,17 @@ def datamatrix(data, cellsize=2, with_border=False):
     with_border
       If false, there will be no border or margin to the datamatrix image.
 
+    fmt
+      Either "png" for a raster image, or "svg" for a vectorial image which
+      is faster to generate, lighter in the final PDF, and sharp at any
+      printer resolution.
+
     Returns
     -------
     image_base64_data
-      A string ``data:image/png;base64,xxxxxxxxx`` which you can provide as a
-      "src" parameter to a ``<img/>`` tag.
+      A string ``data:image/png;base64,xxxxxxxxx`` (or
+      ``data:image/svg+xml;...``) which you can provide as a "src" parameter
+      to a ``<img/>`` tag.
 
     Examples:
     ---------
@@ -135,14 +396,67 @@ def datamatrix(data, cellsize=2, with_border=False):
     >>> data = datamatrix('EGF')
     >>> html_data = '<img src="%s"/>' % data
     """
+    from pystrich.datamatrix import DataMatrixEncoder
+
     encoder = DataMatrixEncoder(data)
-    img_data = encoder.get_imagedata(cellsize=cellsize)
-    img = Image.open(BytesIO(img_data))
-    if not with_border:
-        img = img.crop(ImageOps.invert(img).getbbox())
+    if _VALIDATING.get():
+        return VALIDATION_PLACEHOLDER
+    if fmt == "svg":
+        # The ASCII rendering has two characters ("XX" or "  ") per module.
+        matrix = [
+            [cell == "X" for cell in line[::2]]
+            for line in encoder.get_ascii().split("\n")
+            if line
+        ]
+        if not with_border:
+            dark_rows = [i for i, row in enumerate(matrix) if any(row)]
+            dark_columns = [j for j, col in enumerate(zip(*matrix)) if any(col)]
+            matrix = [
+                row[dark_columns[0] : dark_columns[-1] + 1]
+                for row in matrix[dark_rows[0] : dark_rows[-1] + 1]
+            ]
+        return svg_to_html_imgdata(modules_to_svg(matrix, module_size=cellsize))
+    img = _datamatrix_encoder_image(encoder, cellsize, with_border)
     return pil_to_html_imgdata(img)
 
 
+@functools.lru_cache(maxsize=None)
+def _barcode_setup(barcode_class, fmt):
+    """Return the constructor and writer class for a barcode class and format,
+    and whether the constructor accepts an ``add_checksum`` parameter."""
+    import barcode as python_barcode
+
+    constructor = python_barcode.get_barcode_class(barcode_class)
+    writer_class = {
+        "svg": python_barcode.writer.SVGWriter,
+        "png": python_barcode.writer.ImageWriter,
+    }[fmt]
+    accepts_checksum = "add_checksum" in inspect.signature(constructor).parameters
+    return constructor, writer_class, accepts_checksum
+
+
+def _barcode_object(data, barcode_class, fmt, add_checksum):
+    """Return a python-barcode object for the data, ready to be rendered."""
+    constructor, writer_class, accepts_checksum = _barcode_setup(barcode_class, fmt)
+    data = str(data).zfill(constructor.digits)
+    if accepts_checksum:
+        return constructor(data, writer=writer_class(), add_checksum=add_checksum)
+    return constructor(data, writer=writer_class())
+
+
+def barcode_image(data, barcode_class="code128", add_checksum=True, **writer_options):
+    """Return a barcode as a PIL image.
+
+    The parameters are the same as in ``barcode``. The ``dpi`` writer option
+    sets the resolution of the image (the sizes of the other options being
+    in millimeters).
+    """
+    barcode_img = _barcode_object(data, barcode_class, "png", add_checksum)
+    return barcode_img.render(writer_options=writer_options)
+
+
+@_instrumented
+@_cached
 def barcode(
     data, barcode_class="code128", fmt="png", add_checksum=True, **writer_options
 ):
@@ -189,19 +503,109 @@ def barcode(
     >>>   'write_text': True
     >>> }
     """
-    constructor = python_barcode.get_barcode_class(barcode_class)
-    data = str(data).zfill(constructor.digits)
-    writer = {
-        "svg": python_barcode.writer.SVGWriter,
-        "png": python_barcode.writer.ImageWriter,
-    }[fmt]
-    if "add_checksum" in getattr(constructor, "__init__").__code__.co_varnames:
-        barcode_img = constructor(data, writer=writer(), add_checksum=add_checksum)
-    else:
-        barcode_img = constructor(data, writer=writer())
+    barcode_img = _barcode_object(data, barcode_class, fmt, add_checksum)
+    if _VALIDATING.get():
+        barcode_img.build()
+        return VALIDATION_PLACEHOLDER
     img = barcode_img.render(writer_options=writer_options)
     if fmt == "png":
         return pil_to_html_imgdata(img, fmt="PNG")
     else:
-        prefix = "data:image/svg+xml;charset=utf-8;base64,"
-        return prefix + base64.b64encode(img).decode()
+        return svg_to_html_imgdata(img)
+
+
+def _generate_codes(function_name, data_list, params):
+    """Generate a list of codes (module-level, to run in worker processes)."""
+    function = globals()[function_name]
+    return [function(data, **params) for data in data_list]
+
+
+def _generate_batch(function, data_list, params, workers, chunksize):
+    """Return the codes generated by ``function`` for each data, in order.
+
+    With several workers, the distinct data which are not already cached are
+    sent to worker processes in chunks of ``chunksize``, and the generated
+    codes are stored in ``SYMBOLOGY_CACHE`` so that templates calling the
+    function afterwards get them from the cache.
+    """
+    data_list = list(data_list)
+    if workers is None:
+        workers = os.cpu_count()
+    if workers == 1 or len(data_list) <= chunksize:
+        return [function(data, **params) for data in data_list]
+    codes, missing = {}, []
+    # Data are identified with their type, as equal data of different types
+    # (12 and 12.0) give different codes.
+    distinct_data = {_typed_value(data): data for data in data_list}
+    for typed_data, data in distinct_data.items():
+        key = function.cache_key(data, **params)
+        code = None if key is None else SYMBOLOGY_CACHE.get(key)
+        if code is None:
+            missing.append(data)
+        else:
+            codes[typed_data] = code
+    chunks = [missing[i : i + chunksize] for i in range(0, len(missing), chunksize)]
+    from concurrent.futures import ProcessPoolExecutor
+
+    with profiling.measure("symbology.%s" % function.__name__, count=len(missing)):
+        with ProcessPoolExecutor(workers) as executor:
+            results = executor.map(
+                _generate_codes,
+                [function.__name__] * len(chunks),
+                chunks,
+                [params] * len(chunks),
+            )
+            for chunk, chunk_codes in zip(chunks, results):
+                for data, code in zip(chunk, chunk_codes):
+                    key = function.cache_key(data, **params)
+                    if key is not None:
+                        SYMBOLOGY_CACHE.set(key, code)
+                    codes[_typed_value(data)] = code
+    return [codes[_typed_value(data)] for data in data_list]
+
+
+def qr_code_batch(data_list, workers=1, chunksize=100, **params):
+    """Return the QR codes' image data of a list of data, in the same order.
+
+    Parameters
+    ----------
+    data_list
+      List (or any iterable) of the data to encode.
+
+    workers
+      Number of processes generating the codes (None for as many as there
+      are CPUs). The generated codes are also added to the symbology cache
+      (see ``configure_cache``) so that pre-computing the codes of a batch
+      of records speeds up the templating of the labels afterwards.
+
+    chunksize
+      Number of codes generated by a worker process per task.
+
+    **params
+      Parameters of ``qr_code`` (``fmt``, ``box_size``, etc.).
+
+    Examples:
+    ---------
+
+    >>> codes = qr_code_batch([r["sample_id"] for r in records], workers=4)
+    """
+    return _generate_batch(qr_code, data_list, params, workers, chunksize)
+
+
+def datamatrix_batch(data_list, workers=1, chunksize=100, **params):
+    """Return the datamatrices' image data of a list of data, in order.
+
+    See ``qr_code_batch`` for the parameters, and ``datamatrix`` for the
+    ``params``.
+    """
+    return _generate_batch(datamatrix, data_list, params, workers, chunksize)
+
+
+def barcode_batch(data_list, workers=1, chunksize=100, **params):
+    """Return the barcodes' image data of a list of data, in order.
+
+    The barcode class and writer are resolved once for the whole batch. See
+    ``qr_code_batch`` for the parameters, and ``barcode`` for the
+    ``params``.
+    """
+    return _generate_batch(barcode, data_list, params, workers, chunksize)
@@ -0,0 +1,55 @@
+"""Rasterization of label pages to PNG, for previews.
+
+This requires the optional dependency pypdfium2 (``pip install pypdfium2``)
+which is only imported when a preview is first generated.
+"""
+
+from io import BytesIO
+
+from .caching import LRUCache
+
+#: Cache of the PNG previews generated by ``LabelWriter.preview_pages``,
+#: keyed on the content of each page and the resolution.
+PREVIEW_CACHE = LRUCache(maxsize=256)
+
+
+def configure_cache(maxsize=256, disk_cache=None):
+    """Replace the cache of the page previews.
+
+    ``disk_cache`` is an optional ``caching.DiskCache`` (with no encoding)
+    used to keep the previews across processes and program runs.
+    """
+    global PREVIEW_CACHE
+    PREVIEW_CACHE = LRUCache(maxsize=maxsize, disk_cache=disk_cache)
+
+
+def pdf_page_to_png(pdf, page_index=0, resolution=96):
+    """Return the PNG data of a page of a PDF.
+
+    Parameters
+    ----------
+    pdf
+      The PDF, as raw bytes or a file path.
+
+    page_index
+      Index of the page to rasterize (0 for the first page).
+
+    resolution
+      Resolution of the image in pixels per inch (96 is the resolution of
+      the CSS pixels, i.e. the page's size on screen at 100% zoom).
+    """
+    try:
+        import pypdfium2
+    except ImportError:
+        raise ImportError(
+            "Page previews require pypdfium2, install it with "
+            "`pip install pypdfium2` (or `pip install blabel[preview]`)."
+        )
+    document = pypdfium2.PdfDocument(pdf)
+    try:
+        image = document[page_index].render(scale=resolution / 72.0).to_pil()
+    finally:
+        document.close()
+    with BytesIO() as buffer:
+        image.save(buffer, format="PNG")
+        return buffer.getvalue()
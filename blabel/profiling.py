@@ -0,0 +1,184 @@
+"""Instrumentation of the label rendering pipeline.
+
+Pass a ``RenderStats`` object to ``LabelWriter.write_labels`` (or
+``records_to_html``) to record the time spent in each stage of the job:
+
+- ``validate``: validation of the records (``validate=True``),
+- ``record_to_html``: jinja rendering of each item (symbology included),
+- ``symbology.<name>``: generation of codes by ``label_tools``,
+- ``records_to_html``: assembly of the items into the document's HTML,
+- ``dedupe_images``: hoisting of repeated images out of the HTML,
+- ``layout``: WeasyPrint's HTML parsing, styling and layout,
+- ``pdf_write``: serialization of the laid out document to PDF,
+- ``merge``: concatenation of the PDFs of several shards or batches,
+- ``split_pages``: splitting of rendered PDFs into pages (``page_cache``),
+- ``preview``: rasterization of pages previews (``preview_pages``),
+- ``stamp``: drawing of the stamped fields (``write_stamped_labels``),
+- ``write_labels``: the whole job.
+"""
+
+import heapq
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_ACTIVE_STATS = ContextVar("blabel_active_stats", default=None)
+
+
+def current_stats():
+    """Return the RenderStats of the job being rendered, if any."""
+    return _ACTIVE_STATS.get()
+
+
+@contextmanager
+def measure(stage, count=1):
+    """Add the duration of the ``with`` block to the current job's stats.
+
+    Does nothing if no stats are being collected.
+    """
+    stats = _ACTIVE_STATS.get()
+    if stats is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.add(stage, time.perf_counter() - t0, count=count)
+
+
+class RenderStats:
+    """Timings, counts and sizes collected while rendering labels.
+
+    Parameters
+    ----------
+
+    n_slowest
+      Number of slowest records (to convert to HTML) to keep track of.
+
+    callback
+      Optional function ``f(stage, duration)`` called every time a stage of
+      the pipeline completes, e.g. to forward timings to a metrics system.
+
+    Attributes
+    ----------
+
+    times
+      Dict ``{stage: total time in seconds}``.
+
+    counts
+      Dict ``{stage: number of times the stage ran}`` (the number of labels
+      for ``record_to_html``).
+
+    sizes
+      Dict with the number of characters of HTML (``html``), characters of
+      image data generated by ``label_tools`` (``images``) and bytes of PDF
+      (``pdf``, when the PDF is returned in memory).
+
+    slowest_records
+      List of ``(duration, index, record)`` for the records which took the
+      longest to convert to HTML, slowest first.
+
+    Examples
+    --------
+
+    >>> stats = RenderStats()
+    >>> label_writer.write_labels(records, target="labels.pdf", stats=stats)
+    >>> print(stats.report())
+    """
+
+    def __init__(self, n_slowest=5, callback=None):
+        self.n_slowest = n_slowest
+        self.callback = callback
+        self.times = {}
+        self.counts = {}
+        self.sizes = {"html": 0, "images": 0, "pdf": 0}
+        self._slowest = []
+
+    @contextmanager
+    def activate(self):
+        """Collect the stats of everything rendered in the ``with`` block."""
+        token = _ACTIVE_STATS.set(self)
+        try:
+            yield self
+        finally:
+            _ACTIVE_STATS.reset(token)
+
+    def add(self, stage, duration, count=1):
+        """Record that a stage took ``duration`` seconds."""
+        self.times[stage] = self.times.get(stage, 0) + duration
+        self.counts[stage] = self.counts.get(stage, 0) + count
+        if self.callback is not None:
+            self.callback(stage, duration)
+
+    def add_size(self, kind, size):
+        """Add to the size of the HTML, images or PDF produced."""
+        self.sizes[kind] = self.sizes.get(kind, 0) + size
+
+    def add_record(self, index, record, duration):
+        """Record the time taken to convert one record to HTML."""
+        self.add("record_to_html", duration)
+        self._add_slowest(duration, index, record)
+
+    def _add_slowest(self, duration, index, record):
+        entry = (duration, index, record)
+        if len(self._slowest) < self.n_slowest:
+            heapq.heappush(self._slowest, entry)
+        elif duration > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, entry)
+
+    @property
+    def slowest_records(self):
+        return sorted(self._slowest, key=lambda entry: -entry[0])
+
+    def merge(self, other, index_offset=0):
+        """Add the stats of another RenderStats (or its ``to_dict()``).
+
+        ``index_offset`` is added to the indices of the other stats' slowest
+        records, e.g. the index of the first record of a chunk of records
+        converted in a worker process (whose indices start at 0).
+        """
+        if isinstance(other, RenderStats):
+            slowest_records = other.slowest_records
+            other = other.to_dict()
+        else:
+            slowest_records = [
+                (entry["time"], entry["index"], None)
+                for entry in other.get("slowest_records", ())
+            ]
+        for stage, data in other["stages"].items():
+            self.times[stage] = self.times.get(stage, 0) + data["time"]
+            self.counts[stage] = self.counts.get(stage, 0) + data["count"]
+        for kind, size in other["sizes"].items():
+            self.add_size(kind, size)
+        for duration, index, record in slowest_records:
+            self._add_slowest(duration, index + index_offset, record)
+
+    def to_dict(self):
+        """Return the stats as a JSON-serializable dict."""
+        return dict(
+            stages={
+                stage: dict(time=self.times[stage], count=self.counts[stage])
+                for stage in self.times
+            },
+            sizes=dict(self.sizes),
+            slowest_records=[
+                dict(time=duration, index=index)
+                for (duration, index, _) in self.slowest_records
+            ],
+        )
+
+    def report(self):
+        """Return a human-readable table of the stats."""
+        lines = ["%-28s %10s %8s" % ("stage", "time (s)", "count")]
+        for stage in sorted(self.times, key=lambda stage: -self.times[stage]):
+            lines.append(
+                "%-28s %10.4f %8d" % (stage, self.times[stage], self.counts[stage])
+            )
+        lines.append(
+            "HTML: %(html)d chars, images: %(images)d chars, PDF: %(pdf)d bytes"
+            % self.sizes
+        )
+        for duration, index, _ in self.slowest_records:
+            lines.append("slow record #%d: %.4fs" % (index, duration))
+        return "\n".join(lines)
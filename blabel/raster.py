@@ -0,0 +1,266 @@
+"""Direct rendering of labels to 1-bit images and ZPL, for thermal printers.
+
+Thermal label printers print 1-bit rasters at a fixed resolution (typically
+203 or 300 dpi). ``RasterLabelWriter`` draws each label directly at the
+printer's resolution with PIL, from the images of ``label_tools`` (without
+encoding them as PNG data URIs), and without HTML, WeasyPrint, or PDF. The
+labels can then be sent to the printer as images or as ZPL.
+
+As there is no HTML layout, the label is described by a list of fields
+placed at fixed positions (in millimeters from the top left corner of the
+label). The texts and data of the fields can be jinja2 templates, rendered
+with the variables of each record:
+
+>>> writer = RasterLabelWriter(
+>>>     width=50, height=25, dpi=203,
+>>>     fields=[
+>>>         dict(kind="datamatrix", data="{{ sample_id }}", x=2, y=2, width=21),
+>>>         dict(kind="text", text="{{ sample_name }}", x=25, y=3, font_size=4),
+>>>         dict(kind="barcode", data="{{ sample_id }}", x=25, y=10,
+>>>              params=dict(module_height=10, write_text=False)),
+>>>     ],
+>>> )
+>>> writer.write_zpl(records, target="labels.zpl")
+
+The fields are dicts with a ``kind``, ``x`` and ``y`` coordinates, and:
+
+- ``kind="text"``: ``text``, ``font_size`` (height of the font in mm,
+  default 3), optionally ``font`` (path to a TrueType font file).
+- ``kind="qr_code"`` or ``kind="datamatrix"``: ``data``, ``width`` (in mm)
+  and optionally ``params`` for ``label_tools.qr_code_image`` or
+  ``label_tools.datamatrix_image``. The code is scaled by the largest whole
+  number of dots per module fitting in the width, so all modules have the
+  same size.
+- ``kind="barcode"``: ``data`` and optionally ``params`` (writer options of
+  ``label_tools.barcode_image``, in mm, e.g. ``module_width``,
+  ``module_height``). The barcode is drawn at the printer's resolution.
+- ``kind="image"``: ``path`` of an image file (e.g. a logo), ``width`` and
+  ``height`` in mm.
+"""
+
+import os
+from functools import lru_cache, partial
+
+from . import label_tools
+from . import tools
+from .blabel import GLOBALS, template_from_string
+
+MM_PER_INCH = 25.4
+FIELD_KINDS = ("text", "qr_code", "datamatrix", "barcode", "image")
+
+
+@lru_cache(maxsize=64)
+def _load_font(font, size):
+    from PIL import ImageFont
+
+    if font is not None:
+        return ImageFont.truetype(font, size)
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:  # Pillow < 10.1, the default font has a fixed size
+        return ImageFont.load_default()
+
+
+@lru_cache(maxsize=64)
+def _load_image(path, size):
+    from PIL import Image
+
+    with Image.open(path) as image:
+        return image.convert("L").resize(size, Image.LANCZOS)
+
+
+def _render_value(value, context):
+    """Render a field's value, if it is a jinja2 template."""
+    if isinstance(value, str) and ("{{" in value or "{%" in value):
+        return template_from_string(value).render(context)
+    return value
+
+
+def _fit_code(image, width, height):
+    """Scale a code image by the largest whole factor fitting in the size."""
+    from PIL import Image
+
+    factor = max(1, min(width // image.width, height // image.height))
+    size = (image.width * factor, image.height * factor)
+    return image.convert("L").resize(size, Image.NEAREST)
+
+
+def image_to_zpl(image):
+    """Return the ZPL of a label printing a 1-bit PIL image.
+
+    The image is sent as an uncompressed ``^GFA`` graphic field, with the
+    print width and label length set to the size of the image.
+    """
+    from PIL import Image, ImageOps
+
+    # In ZPL graphic fields, 1 bits are printed (black).
+    inverted = ImageOps.invert(image.convert("L")).convert("1", dither=Image.NONE)
+    data = inverted.tobytes()
+    bytes_per_row = (image.width + 7) // 8
+    return "^XA^PW%d^LL%d^FO0,0^GFA,%d,%d,%d,%s^FS^XZ" % (
+        image.width,
+        image.height,
+        len(data),
+        len(data),
+        bytes_per_row,
+        data.hex().upper(),
+    )
+
+
+def _render_records(writer, records, fmt):
+    """Render records to images or ZPL (module-level, for worker processes)."""
+    if fmt == "zpl":
+        return [writer.record_to_zpl(record) for record in records]
+    return [writer.record_to_image(record) for record in records]
+
+
+class RasterLabelWriter:
+    """Class to write labels as 1-bit images or ZPL, without HTML or PDF.
+
+    See the documentation of ``blabel.raster`` for a description of the
+    fields.
+
+    Parameters
+    ----------
+
+    fields
+      List of dicts describing the texts, codes and images of the label.
+
+    width, height
+      Size of the label in millimeters.
+
+    dpi
+      Resolution of the printer, in dots per inch.
+
+    threshold
+      Gray level (0-255) under which a dot is printed.
+
+    **default_context
+      Variables and functions available in the templates of the fields.
+    """
+
+    def __init__(
+        self, fields, width, height, dpi=203, threshold=128, **default_context
+    ):
+        for field in fields:
+            if field.get("kind") not in FIELD_KINDS:
+                raise ValueError(
+                    "Unknown field kind %s (use one of %s)"
+                    % (field.get("kind"), ", ".join(FIELD_KINDS))
+                )
+        self.fields = [dict(field) for field in fields]
+        self.width = width
+        self.height = height
+        self.dpi = dpi
+        self.threshold = threshold
+        self.default_context = default_context
+
+    def _dots(self, millimeters):
+        return int(round(millimeters * self.dpi / MM_PER_INCH))
+
+    def _field_image(self, field, context):
+        """Return the grayscale PIL image of a code or image field."""
+        kind = field["kind"]
+        if kind == "image":
+            size = (self._dots(field["width"]), self._dots(field["height"]))
+            return _load_image(field["path"], size)
+        data = _render_value(field["data"], context)
+        params = field.get("params", {})
+        if kind == "barcode":
+            params = dict(dict(dpi=self.dpi, quiet_zone=0), **params)
+            return label_tools.barcode_image(data, **params).convert("L")
+        if kind == "qr_code":
+            image = label_tools.qr_code_image(data, **dict(dict(box_size=1), **params))
+        else:
+            image = label_tools.datamatrix_image(
+                data, **dict(dict(cellsize=1), **params)
+            )
+        width = self._dots(field["width"])
+        height = self._dots(field.get("height", field["width"]))
+        return _fit_code(image, width, height)
+
+    def record_to_image(self, record):
+        """Return the label of a record as a 1-bit (mode "1") PIL image."""
+        from PIL import Image, ImageDraw
+
+        context = dict(GLOBALS.items())
+        context.update(self.default_context)
+        context.update(record)
+        size = (self._dots(self.width), self._dots(self.height))
+        canvas = Image.new("L", size, 255)
+        draw = ImageDraw.Draw(canvas)
+        for field in self.fields:
+            position = (self._dots(field.get("x", 0)), self._dots(field.get("y", 0)))
+            if field["kind"] == "text":
+                text = _render_value(field["text"], context)
+                font_size = self._dots(field.get("font_size", 3))
+                font = _load_font(field.get("font"), font_size)
+                draw.multiline_text(position, str(text), fill=0, font=font)
+            else:
+                canvas.paste(self._field_image(field, context), position)
+        lut = [0] * self.threshold + [255] * (256 - self.threshold)
+        return canvas.point(lut, mode="1")
+
+    def record_to_zpl(self, record):
+        """Return the ZPL printing the label of a record."""
+        return image_to_zpl(self.record_to_image(record))
+
+    def _render(self, records, fmt, workers, chunksize):
+        if workers is None:
+            workers = os.cpu_count()
+        if workers == 1:
+            for record in records:
+                yield _render_records(self, [record], fmt)[0]
+            return
+        from concurrent.futures import ProcessPoolExecutor
+
+        render = partial(_render_records, self, fmt=fmt)
+        chunks = tools.iter_chunks(records, chunksize)
+        with ProcessPoolExecutor(workers) as executor:
+            for results in tools.imap_bounded(executor, render, chunks, 2 * workers):
+                for result in results:
+                    yield result
+
+    def records_to_images(self, records, workers=1, chunksize=50):
+        """Yield the 1-bit PIL image of the label of each record, in order.
+
+        Parameters
+        ----------
+
+        records
+          List or iterable of dicts with the variables of each label.
+
+        workers
+          Number of processes rasterizing the labels (None for as many as
+          there are CPUs). The records are sent to the workers in chunks of
+          ``chunksize`` records, and consumed lazily.
+        """
+        return self._render(records, "image", workers, chunksize)
+
+    def write_zpl(self, records, target=None, workers=1, chunksize=50):
+        """Write the ZPL printing the labels of the records.
+
+        Parameters
+        ----------
+
+        records
+          List or iterable of dicts with the variables of each label.
+
+        target
+          A file path, or a binary stream (e.g. a socket file connected to
+          the printer) to which each label is sent as soon as it is ready. If
+          None, the ZPL is returned as a string.
+
+        workers, chunksize
+          See ``records_to_images``.
+        """
+        labels = self._render(records, "zpl", workers, chunksize)
+        if target is None:
+            return "\n".join(labels)
+        if isinstance(target, (str, os.PathLike)):
+            with open(target, "w", encoding="ascii") as f:
+                for zpl in labels:
+                    f.write(zpl + "\n")
+        else:
+            for zpl in labels:
+                target.write((zpl + "\n").encode("ascii"))
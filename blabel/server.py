@@ -0,0 +1,198 @@
+"""Long-lived label rendering server with pre-warmed worker processes.
+
+The server keeps worker processes in which WeasyPrint is already imported,
+and the item template and stylesheets are already loaded, so that each
+request only pays for the rendering of its own labels.
+
+Protocol: the client sends a JSON object followed by a newline, for instance
+``{"records": [{"sample_id": "s01"}, ...]}``. The server answers with a
+2-bytes status (``OK`` or ``ER``), the length of the body as an 8-bytes
+big-endian integer, then the body (the PDF data, or an UTF-8 error message).
+"""
+
+import json
+import os
+import socket
+import socketserver
+import stat
+import struct
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from .blabel import LabelWriter
+
+_WORKER_LABEL_WRITER = None
+
+
+def _init_worker(writer_params, warmup_record):
+    global _WORKER_LABEL_WRITER
+    _WORKER_LABEL_WRITER = LabelWriter(**writer_params)
+    if warmup_record is not None:
+        # Rendering once imports and initializes everything (fonts, etc.)
+        _WORKER_LABEL_WRITER.write_labels([warmup_record])
+
+
+def _ping():
+    return os.getpid()
+
+
+def _render(records):
+    return _WORKER_LABEL_WRITER.write_labels(records)
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline().decode("utf-8"))
+            records = request["records"]
+            status, body = b"OK", self.server.label_server.render(records)
+        except Exception as error:
+            status, body = b"ER", ("%s: %s" % (type(error).__name__, error)).encode()
+        self.wfile.write(status + struct.pack(">Q", len(body)))
+        self.wfile.write(body)
+
+
+class _ThreadingTCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+if hasattr(socketserver, "ThreadingUnixStreamServer"):
+
+    class _ThreadingUnixServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+
+
+class LabelServer:
+    """Server rendering labels for clients connecting to a local socket.
+
+    Parameters
+    ----------
+
+    address
+      Either a path to a Unix socket file, or a ``(host, port)`` tuple for a
+      TCP socket (prefer ``"127.0.0.1"`` as a host, as there is no
+      authentication).
+
+    workers
+      Number of worker processes rendering the labels in parallel.
+
+    warmup_record
+      A record rendered once by each worker at startup, so that fonts and
+      other WeasyPrint resources are loaded before the first request.
+
+    **writer_params
+      Parameters of the ``LabelWriter`` used by the workers, e.g.
+      ``item_template_path``, ``default_stylesheets``, ``items_per_page``.
+      They must be picklable (paths rather than objects).
+
+    Examples
+    --------
+
+    >>> server = LabelServer("/tmp/blabel.sock", workers=4,
+    >>>                      item_template_path="item_template.html",
+    >>>                      default_stylesheets=("style.css",))
+    >>> server.serve_forever()
+    """
+
+    def __init__(self, address, workers=2, warmup_record=None, **writer_params):
+        self.address = address
+        self.workers = workers
+        self._initargs = (writer_params, warmup_record)
+        self._executor_lock = threading.Lock()
+        if isinstance(address, str) and os.path.exists(address):
+            # Only replace the socket of a previous server, never other files.
+            if not stat.S_ISSOCK(os.stat(address).st_mode):
+                raise FileExistsError(
+                    "%s exists and is not a socket, choose another socket path."
+                    % address
+                )
+            os.remove(address)
+        self.executor = self._start_workers()
+        if isinstance(address, str):
+            self.server = _ThreadingUnixServer(address, _RequestHandler)
+        else:
+            self.server = _ThreadingTCPServer(tuple(address), _RequestHandler)
+        self.server.label_server = self
+
+    def _start_workers(self):
+        executor = ProcessPoolExecutor(
+            self.workers, initializer=_init_worker, initargs=self._initargs
+        )
+        # Submitting one task per worker at once starts all the workers now.
+        for future in [executor.submit(_ping) for _ in range(self.workers)]:
+            future.result()
+        return executor
+
+    def render(self, records):
+        """Render the records in a worker and return the PDF data.
+
+        If a worker process died (e.g. killed for using too much memory),
+        the pool of workers can't be used anymore: a new pool is started and
+        the records are rendered again, once.
+        """
+        executor = self.executor
+        try:
+            return executor.submit(_render, records).result()
+        except BrokenProcessPool:
+            with self._executor_lock:
+                # Other requests may have already replaced the broken pool.
+                if self.executor is executor:
+                    executor.shutdown(wait=False)
+                    self.executor = self._start_workers()
+            return self.executor.submit(_render, records).result()
+
+    def serve_forever(self):
+        """Handle requests until ``shutdown`` is called."""
+        try:
+            self.server.serve_forever()
+        finally:
+            self.close()
+
+    def shutdown(self):
+        """Stop ``serve_forever`` (to be called from another thread)."""
+        self.server.shutdown()
+
+    def close(self):
+        """Close the socket and stop the worker processes."""
+        self.server.server_close()
+        self.executor.shutdown()
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.remove(self.address)
+
+
+def _read_exactly(connection, n_bytes):
+    chunks = []
+    while n_bytes:
+        chunk = connection.recv(min(n_bytes, 1 << 20))
+        if not chunk:
+            raise ConnectionError("Connection closed by the label server.")
+        chunks.append(chunk)
+        n_bytes -= len(chunk)
+    return b"".join(chunks)
+
+
+def request_labels(records, address, timeout=None):
+    """Send records to a ``LabelServer`` and return the PDF data.
+
+    ``address`` is the path of the server's Unix socket, or a
+    ``(host, port)`` tuple. Raises a ``RuntimeError`` if the server could not
+    render the labels.
+    """
+    if isinstance(address, str):
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    else:
+        connection = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        address = tuple(address)
+    with connection:
+        connection.settimeout(timeout)
+        connection.connect(address)
+        request = json.dumps(dict(records=list(records))) + "\n"
+        connection.sendall(request.encode("utf-8"))
+        header = _read_exactly(connection, 10)
+        status, (size,) = header[:2], struct.unpack(">Q", header[2:])
+        body = _read_exactly(connection, size)
+    if status != b"OK":
+        raise RuntimeError("Label server error: " + body.decode("utf-8"))
+    return body
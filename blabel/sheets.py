@@ -0,0 +1,173 @@
+"""Layouts of sheets with several labels per page (e.g. Avery sheets).
+
+With a sheet layout, each label is placed at an absolute position on the
+page, computed once per sheet type, rather than laid out by WeasyPrint as
+one of many inline blocks. This is faster for high-density sheets, and the
+position of each label doesn't depend on the size of its content.
+
+>>> label_writer = LabelWriter("item_template.html", sheet="avery-l7651")
+>>> # Print on a sheet whose first 12 labels were already used:
+>>> label_writer = LabelWriter(
+>>>     "item_template.html",
+>>>     sheet=get_sheet("avery-l7651").starting_at(12)
+>>> )
+"""
+
+import copy
+
+
+class SheetLayout:
+    """Layout of a sheet of labels arranged in a grid. Lengths are in mm.
+
+    Parameters
+    ----------
+
+    page_width, page_height
+      Size of the sheet (e.g. 210, 297 for A4).
+
+    rows, columns
+      Number of rows and columns of labels on the sheet.
+
+    label_width, label_height
+      Size of each label.
+
+    top_margin, left_margin
+      Position of the top left label on the sheet.
+
+    horizontal_pitch, vertical_pitch
+      Distance between the left sides (resp. top sides) of two neighbouring
+      labels, i.e. the label size plus the gap between labels. Defaults to
+      the size of the labels (no gaps).
+
+    start_position
+      Index of the first label to use on the first sheet, to print on a
+      partly used sheet. Labels are counted row by row from the top left
+      label, starting at 0.
+    """
+
+    def __init__(
+        self,
+        page_width,
+        page_height,
+        rows,
+        columns,
+        label_width,
+        label_height,
+        top_margin=0,
+        left_margin=0,
+        horizontal_pitch=None,
+        vertical_pitch=None,
+        start_position=0,
+    ):
+        self.page_width = page_width
+        self.page_height = page_height
+        self.rows = rows
+        self.columns = columns
+        self.label_width = label_width
+        self.label_height = label_height
+        self.top_margin = top_margin
+        self.left_margin = left_margin
+        if horizontal_pitch is None:
+            horizontal_pitch = label_width
+        if vertical_pitch is None:
+            vertical_pitch = label_height
+        self.horizontal_pitch = horizontal_pitch
+        self.vertical_pitch = vertical_pitch
+        if not 0 <= start_position < rows * columns:
+            raise ValueError(
+                "start_position should be between 0 and %d, not %s"
+                % (rows * columns - 1, start_position)
+            )
+        self.start_position = start_position
+
+    @property
+    def labels_per_sheet(self):
+        return self.rows * self.columns
+
+    def starting_at(self, start_position):
+        """Return a copy of the layout starting at another label position."""
+        layout = copy.copy(self)
+        layout.__init__(**dict(self.__dict__, start_position=start_position))
+        return layout
+
+    def positions(self):
+        """Return the ``(x, y)`` positions of the labels, row by row."""
+        return [
+            (
+                self.left_margin + column * self.horizontal_pitch,
+                self.top_margin + row * self.vertical_pitch,
+            )
+            for row in range(self.rows)
+            for column in range(self.columns)
+        ]
+
+    def css(self):
+        """Return the CSS placing the sheets and labels."""
+        return (
+            "@page { size: %(page_width).3fmm %(page_height).3fmm; margin: 0; }\n"
+            "body, html { margin: 0; padding: 0; }\n"
+            ".print-area { position: relative; overflow: hidden;"
+            " width: %(page_width).3fmm; height: %(page_height).3fmm;"
+            " page-break-after: always; }\n"
+            ".item { position: absolute; overflow: hidden; margin: 0;"
+            " width: %(label_width).3fmm; height: %(label_height).3fmm; }\n"
+        ) % self.__dict__
+
+    def __repr__(self):
+        return "SheetLayout(%s)" % ", ".join(
+            "%s=%r" % item for item in self.__dict__.items()
+        )
+
+
+SHEETS = {
+    # A4, 65 labels of 38.1 x 21.2 mm.
+    "avery-l7651": SheetLayout(
+        page_width=210,
+        page_height=297,
+        rows=13,
+        columns=5,
+        label_width=38.1,
+        label_height=21.2,
+        top_margin=10.7,
+        left_margin=4.7,
+        horizontal_pitch=40.6,
+        vertical_pitch=21.2,
+    ),
+    # A4, 21 labels of 63.5 x 38.1 mm.
+    "avery-l7160": SheetLayout(
+        page_width=210,
+        page_height=297,
+        rows=7,
+        columns=3,
+        label_width=63.5,
+        label_height=38.1,
+        top_margin=15.15,
+        left_margin=7.25,
+        horizontal_pitch=66.04,
+        vertical_pitch=38.1,
+    ),
+    # US Letter, 30 labels of 2.625 x 1 inches.
+    "avery-5160": SheetLayout(
+        page_width=215.9,
+        page_height=279.4,
+        rows=10,
+        columns=3,
+        label_width=66.675,
+        label_height=25.4,
+        top_margin=12.7,
+        left_margin=4.7625,
+        horizontal_pitch=69.85,
+        vertical_pitch=25.4,
+    ),
+}
+
+
+def get_sheet(sheet):
+    """Return a SheetLayout from a layout or the name of a layout in SHEETS."""
+    if isinstance(sheet, SheetLayout):
+        return sheet
+    if sheet not in SHEETS:
+        raise ValueError(
+            "Unknown sheet %s. Known sheets: %s" % (sheet, ", ".join(sorted(SHEETS)))
+        )
+    return SHEETS[sheet]
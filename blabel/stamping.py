@@ -0,0 +1,424 @@
+"""Fast rendering of homogeneous label runs by stamping variable fields.
+
+In an item template, the elements whose content changes from one label to
+the next (texts, code images) are marked with a ``data-stamp`` attribute:
+
+.. code:: html
+
+    <img data-stamp="code" src="{{ label_tools.datamatrix(sample_id) }}"/>
+    <div data-stamp="name" class="name">{{ sample_name }}</div>
+    <div class="footer">Made with blabel</div>
+
+WeasyPrint then lays out a single page, with the stamped elements hidden,
+which serves as the background of every page. For each label, the stamped
+texts and images are drawn directly in the PDF at the positions of the
+elements in that layout, which is much faster than laying out every label.
+
+Limitations: the stamped elements should have a fixed size (their position
+is computed once, from the first page's content); stamped texts are drawn in
+the PDF built-in Helvetica font (bold if the element is bold), line by line
+(only explicit line breaks are kept); stamped images must be raster images
+(e.g. PNG codes, not ``fmt="svg"``); stamped elements cannot be nested.
+As Helvetica is used with the cp1252 (WinAnsi) encoding, the characters of
+stamped texts which are not in cp1252 (e.g. non-Latin scripts) are printed as
+"?" (use ``write_labels`` for such labels).
+
+Stamping relies on internal APIs of WeasyPrint (the layout boxes of a page)
+and pypdf (adding objects to a PDF). A ``RuntimeError`` is raised if these
+are not available in the installed versions.
+"""
+
+import base64
+import os
+import re
+import zlib
+from html.parser import HTMLParser
+from io import BytesIO
+from urllib.parse import urljoin
+from urllib.request import pathname2url, urlopen
+
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import (
+    ArrayObject,
+    DecodedStreamObject,
+    DictionaryObject,
+    NameObject,
+    NumberObject,
+)
+
+from . import tools
+
+# 72 PDF points per inch / 96 CSS pixels per inch.
+PX_TO_PT = 0.75
+
+# Widths of the printable ASCII characters (32 to 126) in Helvetica, in
+# thousandths of the font size (from the font's AFM metrics).
+HELVETICA_WIDTHS = [
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333,
+    278, 278, 556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278,
+    584, 584, 584, 556, 1015, 667, 667, 722, 722, 667, 611, 778, 722, 278,
+    500, 667, 556, 833, 722, 778, 667, 778, 722, 667, 611, 722, 667, 944,
+    667, 667, 611, 278, 278, 278, 469, 556, 333, 556, 556, 500, 556, 556,
+    278, 556, 556, 222, 222, 500, 222, 833, 556, 556, 556, 556, 333, 500,
+    278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+]  # fmt: skip
+HELVETICA_ASCENT = 0.718
+HELVETICA_DESCENT = 0.207
+
+
+def _unsupported_version_error(library, feature):
+    try:
+        from importlib.metadata import version
+
+        library_version = version(library)
+    except Exception:
+        library_version = "unknown"
+    return RuntimeError(
+        "Stamped labels rely on %s of %s, which changed in the installed "
+        "version (%s). Use write_labels, or another version of %s."
+        % (feature, library, library_version, library)
+    )
+
+
+HIDE_STAMPED_FIELDS_CSS = "[data-stamp] { visibility: hidden !important; }"
+
+
+class _StampedFieldsParser(HTMLParser):
+    """Collect the content of the elements with a ``data-stamp`` attribute."""
+
+    def __init__(self):
+        HTMLParser.__init__(self, convert_charrefs=True)
+        self.fields = []
+        self._text = None
+        self._depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if self._text is not None:
+            if tag == "br":
+                self._text.append("\n")
+            elif tag not in ("img", "input", "hr", "meta", "link", "wbr"):
+                self._depth += 1
+            return
+        attrs = dict(attrs)
+        if "data-stamp" not in attrs:
+            return
+        if tag == "img":
+            self.fields.append(("image", attrs.get("src", "")))
+        else:
+            self._text = []
+            self._depth = 1
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if self._text is None or tag in ("br", "img", "input", "hr"):
+            return
+        self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if self._text is None:
+            return
+        self._depth -= 1
+        if self._depth == 0:
+            lines = "".join(self._text).split("\n")
+            text = "\n".join(" ".join(line.split()) for line in lines).strip()
+            self.fields.append(("text", text))
+            self._text = None
+
+    def handle_data(self, data):
+        if self._text is not None:
+            self._text.append(data)
+
+
+def parse_stamped_fields(item_html):
+    """Return the list of ``(kind, value)`` of the stamped fields of an item.
+
+    ``kind`` is "text" (and ``value`` the text, with line breaks) or "image"
+    (and ``value`` the image's URL, typically a data URI).
+    """
+    parser = _StampedFieldsParser()
+    parser.feed(item_html)
+    parser.close()
+    return parser.fields
+
+
+def find_stamped_boxes(page):
+    """Return the geometry and style of the stamped elements of a page.
+
+    ``page`` is a page of a document rendered by WeasyPrint. The result is a
+    list of dicts (one per stamped element, in document order) with the
+    content box (``x``, ``y``, ``width``, ``height``) in CSS pixels, and the
+    ``font_size``, ``bold``, ``color`` (RGB floats) and ``align`` of the
+    element.
+    """
+    page_box = getattr(page, "_page_box", None)
+    if not hasattr(page_box, "descendants"):
+        raise _unsupported_version_error("weasyprint", "the internal layout boxes")
+    try:
+        return _stamped_boxes(page_box)
+    except (AttributeError, KeyError, TypeError) as error:
+        raise _unsupported_version_error(
+            "weasyprint", "the internal layout boxes"
+        ) from error
+
+
+def _stamped_boxes(page_box):
+    boxes = []
+    seen_elements = set()
+    try:
+        # Also descend into absolutely positioned boxes (such as the items of
+        # sheet layouts), which are left out by default.
+        descendants = page_box.descendants(placeholders=True)
+    except TypeError:  # WeasyPrint versions without the placeholders option
+        descendants = page_box.descendants()
+    for box in descendants:
+        element = box.element
+        if element is None or element.get("data-stamp") is None:
+            continue
+        if id(element) in seen_elements:
+            continue  # Children or continuations of an element already seen.
+        seen_elements.add(id(element))
+        style = box.style
+        color = style["color"]
+        if hasattr(color, "to"):
+            color = color.to("srgb")
+        align = "left"
+        for key in ("text_align_all", "text_align"):
+            try:
+                align = style[key]
+                break
+            except KeyError:
+                pass
+        boxes.append(
+            dict(
+                x=box.content_box_x(),
+                y=box.content_box_y(),
+                width=box.width,
+                height=box.height,
+                font_size=style["font_size"],
+                bold=style["font_weight"] >= 600,
+                color=tuple(color)[:3],
+                align={"start": "left", "end": "right"}.get(align, align),
+            )
+        )
+    return boxes
+
+
+def _text_width(text, font_size):
+    widths = HELVETICA_WIDTHS
+    total = 0
+    for character in text:
+        code = ord(character) - 32
+        total += widths[code] if 0 <= code < len(widths) else 556
+    return total * font_size / 1000.0
+
+
+def _pdf_string(text):
+    data = text.encode("cp1252", errors="replace")
+    for special in (b"\\", b"(", b")"):
+        data = data.replace(special, b"\\" + special)
+    return b"(" + data + b")"
+
+
+def _load_image_data(url, base_url=None):
+    if url.startswith("data:"):
+        header, data = url.split(",", 1)
+        if header.endswith(";base64"):
+            return base64.b64decode(data)
+        return data.encode()
+    if not re.match(r"^[a-zA-Z][a-zA-Z0-9.+-]+:", url):
+        base_url = base_url or "."
+        if not re.match(r"^[a-zA-Z][a-zA-Z0-9.+-]+:", base_url):
+            base_url = "file:" + pathname2url(os.path.abspath(base_url)) + "/"
+        url = urljoin(base_url, url)
+    with urlopen(url) as response:
+        return response.read()
+
+
+def _image_xobject(url, base_url=None):
+    """Return a PDF image XObject for a raster image URL (or data URI)."""
+    from PIL import Image
+
+    try:
+        image = Image.open(BytesIO(_load_image_data(url, base_url)))
+    except Exception:
+        raise ValueError(
+            "Stamped images must be raster images (e.g. PNG), got %s..." % url[:40]
+        )
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        background = Image.new("RGBA", image.size, "white")
+        image = Image.alpha_composite(background, image)
+    if image.mode in ("1", "L", "I", "I;16"):
+        image, color_space = image.convert("L"), "/DeviceGray"
+    else:
+        image, color_space = image.convert("RGB"), "/DeviceRGB"
+    xobject = DecodedStreamObject()
+    xobject.set_data(zlib.compress(image.tobytes()))
+    xobject.update(
+        {
+            NameObject("/Type"): NameObject("/XObject"),
+            NameObject("/Subtype"): NameObject("/Image"),
+            NameObject("/Width"): NumberObject(image.width),
+            NameObject("/Height"): NumberObject(image.height),
+            NameObject("/ColorSpace"): NameObject(color_space),
+            NameObject("/BitsPerComponent"): NumberObject(8),
+            NameObject("/Filter"): NameObject("/FlateDecode"),
+        }
+    )
+    return xobject
+
+
+def _font(base_font):
+    return DictionaryObject(
+        {
+            NameObject("/Type"): NameObject("/Font"),
+            NameObject("/Subtype"): NameObject("/Type1"),
+            NameObject("/BaseFont"): NameObject(base_font),
+            NameObject("/Encoding"): NameObject("/WinAnsiEncoding"),
+        }
+    )
+
+
+def _add_object(writer, obj):
+    """Add an object to a pypdf writer and return its indirect reference."""
+    if not hasattr(writer, "_add_object"):
+        raise _unsupported_version_error("pypdf", "the internal PdfWriter API")
+    return writer._add_object(obj)
+
+
+def _stream(writer, data):
+    stream = DecodedStreamObject()
+    stream.set_data(data)
+    return _add_object(writer, stream)
+
+
+class _Stamper:
+    """Build a PDF whose pages are a background page plus stamped fields."""
+
+    def __init__(self, base_url=None):
+        self.base_url = base_url
+        self.writer = PdfWriter()
+        self.fonts = {
+            False: _add_object(self.writer, _font("/Helvetica")),
+            True: _add_object(self.writer, _font("/Helvetica-Bold")),
+        }
+        self.images = {}
+        self.save_state = _stream(self.writer, b"q\n")
+        self.restore_state = _stream(self.writer, b"Q\n")
+
+    def _image(self, url):
+        if url not in self.images:
+            name = "/BlabelIm%d" % len(self.images)
+            self.images[url] = (
+                name,
+                _add_object(self.writer, _image_xobject(url, self.base_url)),
+            )
+        return self.images[url]
+
+    def add_page(self, background_page, boxes, fields):
+        """Add a page made of the background and the stamped fields.
+
+        ``boxes`` are the stamped boxes of the background (see
+        ``find_stamped_boxes``) and ``fields`` the ``(kind, value)`` to draw
+        in each box.
+        """
+        page = self.writer.add_page(background_page)
+        page_height = float(page.mediabox.height)
+        operations = []
+        xobjects = {}
+        for box, (kind, value) in zip(boxes, fields):
+            x = box["x"] * PX_TO_PT
+            if kind == "image":
+                name, reference = self._image(value)
+                xobjects[name] = reference
+                width, height = box["width"] * PX_TO_PT, box["height"] * PX_TO_PT
+                y = page_height - box["y"] * PX_TO_PT - height
+                operations.append(
+                    b"q %.3f 0 0 %.3f %.3f %.3f cm %s Do Q"
+                    % (width, height, x, y, name.encode())
+                )
+                continue
+            font_size = box["font_size"]
+            line_height = 1.2 * font_size
+            half_leading = (
+                line_height - (HELVETICA_ASCENT + HELVETICA_DESCENT) * font_size
+            ) / 2
+            baseline = box["y"] + half_leading + HELVETICA_ASCENT * font_size
+            font = b"/BlabelF%d" % int(box["bold"])
+            operations.append(
+                b"BT %s %.3f Tf %.3f %.3f %.3f rg"
+                % ((font, font_size * PX_TO_PT) + tuple(box["color"]))
+            )
+            for line in value.split("\n"):
+                line_x = box["x"]
+                if box["align"] in ("center", "right"):
+                    free_space = box["width"] - _text_width(line, font_size)
+                    line_x += free_space / 2 if box["align"] == "center" else free_space
+                operations.append(
+                    b"1 0 0 1 %.3f %.3f Tm %s Tj"
+                    % (
+                        line_x * PX_TO_PT,
+                        page_height - baseline * PX_TO_PT,
+                        _pdf_string(line),
+                    )
+                )
+                baseline += line_height
+            operations.append(b"ET")
+
+        resources = DictionaryObject(page["/Resources"].get_object())
+        fonts = DictionaryObject(
+            resources.get("/Font", DictionaryObject()).get_object()
+        )
+        fonts[NameObject("/BlabelF0")] = self.fonts[False]
+        fonts[NameObject("/BlabelF1")] = self.fonts[True]
+        resources[NameObject("/Font")] = fonts
+        if xobjects:
+            all_xobjects = DictionaryObject(
+                resources.get("/XObject", DictionaryObject()).get_object()
+            )
+            for name, reference in xobjects.items():
+                all_xobjects[NameObject(name)] = reference
+            resources[NameObject("/XObject")] = all_xobjects
+        page[NameObject("/Resources")] = resources
+
+        contents = page.raw_get("/Contents")
+        if isinstance(contents.get_object(), ArrayObject):
+            contents = list(contents.get_object())
+        else:
+            contents = [contents]
+        overlay = _stream(self.writer, b"\n".join(operations))
+        page[NameObject("/Contents")] = ArrayObject(
+            [self.save_state] + contents + [self.restore_state, overlay]
+        )
+
+    def write(self, target):
+        return tools.write_to_target(self.writer.write, target)
+
+
+def stamp_pages(pages, target=None, base_url=None):
+    """Write a PDF made of background pages with stamped fields.
+
+    Parameters
+    ----------
+    pages
+      Iterable of ``(background_pdf, boxes, fields)``, one per page, where
+      ``background_pdf`` is the raw data of a one-page PDF (several pages
+      usually share the same background data), ``boxes`` the stamped boxes
+      of this background (see ``find_stamped_boxes``) and ``fields`` the
+      list of ``(kind, value)`` to stamp in these boxes.
+
+    target
+      A PDF file path or writable stream, or None, "@memory" or "@memoryview"
+      for returning the PDF data (see ``tools.write_to_target``).
+
+    base_url
+      Origin of the relative URLs of the stamped images.
+    """
+    stamper = _Stamper(base_url=base_url)
+    backgrounds = {}
+    for background_pdf, boxes, fields in pages:
+        if background_pdf not in backgrounds:
+            reader = PdfReader(BytesIO(background_pdf))
+            backgrounds[background_pdf] = reader.pages[0]
+        stamper.add_page(backgrounds[background_pdf], boxes, fields)
+    return stamper.write(target)
@@ -1,8 +1,339 @@
+import base64
+import csv
+import hashlib
+import json
+import os
+import re
+from array import array
+from collections import deque
+from functools import partial
+from io import BytesIO
+from itertools import islice
+
+from . import profiling
+
+
 def list_chunks(mylist, n):
     """Yield successive n-sized chunks from mylist."""
     return [mylist[i : i + n] for i in range(0, len(mylist), n)]
 
 
+def iter_chunks(iterable, n):
+    """Lazily yield successive n-sized lists from any iterable.
+
+    Unlike ``list_chunks``, this never holds more than one chunk in memory,
+    so it can be used on generators of arbitrary length.
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, n))
+        if not chunk:
+            return
+        yield chunk
+
+
+def imap_bounded(executor, function, iterable, max_pending):
+    """Map a function over an iterable with an executor, in order.
+
+    Unlike ``executor.map``, which consumes the whole iterable upfront, at
+    most ``max_pending`` tasks are submitted at any time, so the iterable is
+    only consumed as fast as the results are.
+    """
+    pending = deque()
+    for element in iterable:
+        pending.append(executor.submit(function, element))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def page_aligned_chunks(records, items_per_page, n_chunks):
+    """Split the records into at most n_chunks lists of whole pages.
+
+    Every chunk but the last one holds a multiple of ``items_per_page``
+    records, so that rendering the chunks separately and concatenating the
+    resulting PDFs gives exactly the same pages as rendering all records at
+    once.
+    """
+    n_pages = -(-len(records) // items_per_page)
+    pages_per_chunk = max(1, -(-n_pages // n_chunks))
+    return list_chunks(records, pages_per_chunk * items_per_page)
+
+
+class _PositionTrackingStream:
+    """Wrapper of a writable stream counting the bytes written to it.
+
+    It provides the ``tell()`` method that pypdf needs to write a PDF, so
+    PDFs can be written to non-seekable streams such as sockets, pipes or
+    HTTP responses.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.position = 0
+
+    def write(self, data):
+        self.stream.write(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        if hasattr(self.stream, "flush"):
+            self.stream.flush()
+
+
+def write_to_target(write, target=None):
+    """Write a PDF to a file, a stream, or memory.
+
+    Parameters
+    ----------
+    write
+      A function ``write(stream)`` writing the PDF data in a binary stream.
+
+    target
+      A file path, or any object with a ``write`` method (the stream does
+      not need to be seekable, so the PDF can be sent directly through a
+      socket or a HTTP response). If None or "@memory", the raw bytes of the
+      PDF are returned. If "@memoryview", a memoryview of the buffer the PDF
+      was written to is returned, which avoids copying large PDFs.
+    """
+    if target in (None, "@memory", "@memoryview"):
+        buffer = BytesIO()
+        write(buffer)
+        if target == "@memoryview":
+            return buffer.getbuffer()
+        return buffer.getvalue()
+    if isinstance(target, (str, os.PathLike)):
+        with open(target, "wb") as f:
+            write(f)
+    else:
+        write(_PositionTrackingStream(target))
+        if hasattr(target, "flush"):
+            target.flush()
+
+
+# Page attributes which a page can inherit from its ancestors in the page tree.
+_INHERITABLE_PAGE_ATTRIBUTES = ("/Resources", "/MediaBox", "/CropBox", "/Rotate")
+
+
+def _write_merged_pdf(pdfs, stream):
+    """Write the pages of the PDFs in the stream, one PDF at a time.
+
+    The objects used by the pages of each PDF (page dicts, content streams,
+    fonts, images...) are renumbered and written as soon as the PDF is read,
+    so only one of the PDFs is in memory at any time. The page tree, catalog
+    and cross-reference table, which only hold the page numbers and object
+    offsets, are written at the end.
+    """
+    from pypdf import PdfReader
+    from pypdf.generic import (
+        ArrayObject,
+        DictionaryObject,
+        IndirectObject,
+        NameObject,
+        NullObject,
+        NumberObject,
+    )
+
+    stream = _PositionTrackingStream(stream)
+    stream.write(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n")
+    # offsets[number] is the position of the object; 1 and 2 are the catalog
+    # and the page tree, written last. Arrays of integers keep these small
+    # for jobs with millions of objects.
+    offsets = array("q", [0, 0, 0])
+    pages_numbers = array("q")
+    page_tree_reference = IndirectObject(2, 0, None)
+
+    def write_object(number, obj):
+        offsets[number] = stream.tell()
+        stream.write(b"%d 0 obj\n" % number)
+        obj.write_to_stream(stream)
+        stream.write(b"\nendobj\n")
+
+    for pdf in pdfs:
+        with profiling.measure("merge"):
+            if isinstance(pdf, bytes):
+                pdf = BytesIO(pdf)
+            reader = PdfReader(pdf)
+            numbers = {}  # (idnum, generation) in the PDF => new number
+            pending = []  # references to objects not written yet
+            pages = {}  # new number => page object
+
+            def reference(indirect):
+                key = (indirect.idnum, indirect.generation)
+                if key not in numbers:
+                    offsets.append(0)
+                    numbers[key] = len(offsets) - 1
+                    pending.append(indirect)
+                return IndirectObject(numbers[key], 0, None)
+
+            def renumber(obj):
+                if isinstance(obj, IndirectObject):
+                    return reference(obj)
+                if isinstance(obj, DictionaryObject):
+                    for key, value in list(dict.items(obj)):
+                        dict.__setitem__(obj, key, renumber(value))
+                elif isinstance(obj, ArrayObject):
+                    for index, value in enumerate(list(list.__iter__(obj))):
+                        list.__setitem__(obj, index, renumber(value))
+                return obj
+
+            for page in reader.pages:
+                for attribute in _INHERITABLE_PAGE_ATTRIBUTES:
+                    node = page
+                    while attribute not in node and "/Parent" in node:
+                        node = node["/Parent"].get_object()
+                    if node is not page and attribute in node:
+                        value = dict.__getitem__(node, attribute)
+                        dict.__setitem__(page, NameObject(attribute), value)
+                dict.pop(page, "/Parent", None)
+                number = reference(page.indirect_reference).idnum
+                pages[number] = page
+                pages_numbers.append(number)
+            while pending:
+                indirect = pending.pop()
+                number = numbers[(indirect.idnum, indirect.generation)]
+                obj = pages.get(number)
+                if obj is None:
+                    obj = indirect.get_object()
+                    if obj is None:
+                        obj = NullObject()
+                obj = renumber(obj)
+                if number in pages:
+                    dict.__setitem__(obj, NameObject("/Parent"), page_tree_reference)
+                write_object(number, obj)
+
+    page_tree = DictionaryObject()
+    page_tree[NameObject("/Type")] = NameObject("/Pages")
+    page_tree[NameObject("/Kids")] = ArrayObject(
+        IndirectObject(number, 0, None) for number in pages_numbers
+    )
+    page_tree[NameObject("/Count")] = NumberObject(len(pages_numbers))
+    write_object(2, page_tree)
+    catalog = DictionaryObject()
+    catalog[NameObject("/Type")] = NameObject("/Catalog")
+    catalog[NameObject("/Pages")] = page_tree_reference
+    write_object(1, catalog)
+    xref_offset = stream.tell()
+    stream.write(b"xref\n0 %d\n0000000000 65535 f \n" % len(offsets))
+    for start in range(1, len(offsets), 10000):
+        entries = offsets[start : start + 10000]
+        stream.write(b"".join(b"%010d 00000 n \n" % offset for offset in entries))
+    stream.write(
+        b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+        % (len(offsets), xref_offset)
+    )
+
+
+def merge_pdfs(pdfs, target=None):
+    """Concatenate the pages of several PDF documents into a single PDF.
+
+    The PDFs are read one at a time, and the objects of their pages are
+    written to the target as soon as each PDF is read. When the target is a
+    file or a stream, the memory used is therefore bounded by the size of
+    the largest PDF, not of the merged PDF (only the pages' object numbers
+    and offsets are kept until the end). Document-level elements of the PDFs
+    (outlines, named destinations, metadata) are not kept.
+
+    Parameters
+    ----------
+    pdfs
+      Iterable of PDF documents, each given as raw bytes, a file path, or a
+      file-like object. The pages are written in the order of this iterable,
+      which is consumed lazily (e.g. a generator of PDFs rendered batch
+      after batch).
+
+    target
+      A PDF file path or writable stream, or None, "@memory" or
+      "@memoryview" for returning the merged PDF data (see
+      ``write_to_target``).
+    """
+    return write_to_target(partial(_write_merged_pdf, pdfs), target)
+
+
+def split_pdf_pages(pdf):
+    """Return a list of single-page PDF documents (bytes) from a PDF.
+
+    The PDF can be given as raw bytes, a file path, or a file-like object.
+    """
+    from pypdf import PdfReader, PdfWriter
+
+    if isinstance(pdf, bytes):
+        pdf = BytesIO(pdf)
+    pages = []
+    for page in PdfReader(pdf).pages:
+        writer = PdfWriter()
+        writer.add_page(page)
+        with BytesIO() as buffer:
+            writer.write(buffer)
+            pages.append(buffer.getvalue())
+    return pages
+
+
+DATA_URI_REGEX = re.compile(
+    r"data:([\w/+.-]+)((?:;[\w.=-]+)*;base64),([A-Za-z0-9+/=]+)"
+)
+RESOURCE_URL_PREFIX = "blabel-resource:"
+
+
+def hoist_data_uris(html, min_length=256):
+    """Replace the base64 data URIs of a HTML document by short URLs.
+
+    Each distinct data URI (e.g. a logo repeated on every label) is decoded
+    once and replaced everywhere by a short ``blabel-resource:`` URL, so the
+    HTML is much smaller and WeasyPrint loads and embeds each image once.
+
+    Returns ``(new_html, resources)`` where ``resources`` is a dict
+    ``{url: (mime_type, data)}`` to be served by the URL fetcher used for
+    rendering (see ``blabel.write_pdf``). Data URIs shorter than
+    ``min_length`` characters are left as they are.
+    """
+    urls = {}
+    resources = {}
+
+    def replace(match):
+        uri = match.group(0)
+        if len(uri) < min_length:
+            return uri
+        url = urls.get(uri)
+        if url is None:
+            url = RESOURCE_URL_PREFIX + hashlib.sha1(uri.encode()).hexdigest()
+            urls[uri] = url
+            resources[url] = (match.group(1), base64.b64decode(match.group(3)))
+        return url
+
+    return DATA_URI_REGEX.sub(replace, html), resources
+
+
+def read_records(lines, fmt="csv"):
+    """Lazily yield records (dicts) from the lines of a text file.
+
+    Parameters
+    ----------
+    lines
+      An open text file (or any iterable of lines), e.g. ``sys.stdin``.
+
+    fmt
+      Either "csv" or "tsv" (the first line gives the column names, all
+      values are strings) or "jsonl" (one JSON object per line, blank lines
+      are ignored).
+    """
+    if fmt in ("csv", "tsv"):
+        delimiter = "," if fmt == "csv" else "\t"
+        for record in csv.DictReader(lines, delimiter=delimiter):
+            yield record
+    elif fmt == "jsonl":
+        for line in lines:
+            if line.strip():
+                yield json.loads(line)
+    else:
+        raise ValueError("Unknown records format: %s" % fmt)
+
+
 class JupyterPDF(object):
     """Class to display PDFs in a Jupyter / IPython notebook.
     Just write this at the end of a code Cell to get in-browser PDF preview:
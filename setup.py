@@ -24,5 +24,8 @@ setup(
         "python-barcode",
         "pillow",
         "weasyprint",
+        "pypdf",
     ],
+    extras_require={"preview": ["pypdfium2"]},
+    entry_points={"console_scripts": ["blabel = blabel.cli:main"]},
 )
@@ -0,0 +1,23 @@
+import os
+
+from blabel.caching import DiskCache
+
+
+def test_disk_cache_eviction(tmpdir):
+    cache = DiskCache(str(tmpdir), max_size=1000)
+    for i in range(5):
+        cache.set(("value", i), b"x" * 300)
+        # Make the values' last use times distinct and increasing.
+        os.utime(cache._path(("value", i)), (i, i))
+    assert cache.size() <= 900
+    assert cache.get(("value", 0)) is None
+    assert cache.get(("value", 4)) == b"x" * 300
+
+    # Reading a value marks it as recently used.
+    os.utime(cache._path(("value", 3)), (0, 0))
+    cache.get(("value", 3))
+    cache.set(("value", 5), b"x" * 600)
+    assert cache.get(("value", 3)) == b"x" * 300
+    assert cache.get(("value", 4)) is None
+    cache.clear()
+    assert cache.size() == 0
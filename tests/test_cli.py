@@ -0,0 +1,49 @@
+import os
+
+import pypdf
+
+from blabel.cli import main
+
+SAMPLES_DIR = os.path.join("tests", "data", "samples")
+
+
+def test_render_command(tmpdir):
+    folder = os.path.join(SAMPLES_DIR, "labels_from_spreadsheet")
+    target = os.path.join(str(tmpdir), "labels.pdf")
+    main(
+        [
+            "render",
+            os.path.join(folder, "item_template.html"),
+            os.path.join(folder, "records.csv"),
+            "--stylesheet",
+            os.path.join(folder, "style.css"),
+            "--batch-size",
+            "2",
+            "-o",
+            target,
+        ]
+    )
+    assert len(pypdf.PdfReader(target).pages) == 3
+
+
+def test_render_with_page_cache(tmpdir):
+    folder = os.path.join(SAMPLES_DIR, "labels_from_spreadsheet")
+    cache_folder = os.path.join(str(tmpdir), "cache")
+    for name in ("labels.pdf", "reprint.pdf"):
+        main(
+            [
+                "render",
+                os.path.join(folder, "item_template.html"),
+                os.path.join(folder, "records.csv"),
+                "--stylesheet",
+                os.path.join(folder, "style.css"),
+                "--page-cache",
+                cache_folder,
+                "--page-cache-size",
+                "10",
+                "-o",
+                os.path.join(str(tmpdir), name),
+            ]
+        )
+    assert len(pypdf.PdfReader(os.path.join(str(tmpdir), "reprint.pdf")).pages) == 3
+    assert sum(len(files) for _, _, files in os.walk(cache_folder)) == 3
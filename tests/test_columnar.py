@@ -0,0 +1,60 @@
+import pickle
+
+import numpy
+import pandas
+import pytest
+
+import blabel
+from blabel.columnar import ColumnarRecords, as_records
+
+SOURCE = "{{ sample_id }}:{{ volume }}"
+RECORDS = [
+    dict(sample_id="s01", volume=10),
+    dict(sample_id="s02", volume=25),
+    dict(sample_id="s03", volume=5),
+]
+
+
+def test_columnar_records():
+    records = as_records(
+        dict(sample_id=["s01", "s02", "s03"], volume=numpy.array([10, 25, 5]))
+    )
+    assert len(records) == 3
+    assert [dict(record) for record in records] == RECORDS
+    assert records[-1]["sample_id"] == "s03"
+    assert [dict(record) for record in records[1:]] == RECORDS[1:]
+    assert "volume" in records[0] and "mass" not in records[0]
+    with pytest.raises(KeyError):
+        records[0]["mass"]
+    assert pickle.loads(pickle.dumps(records[1])) == RECORDS[1]
+    with pytest.raises(ValueError):
+        ColumnarRecords(dict(sample_id=["s01"], volume=[1, 2]))
+    assert as_records(RECORDS) is RECORDS
+
+
+def test_dicts_of_non_columns_are_rejected():
+    label_writer = blabel.LabelWriter(item_template=SOURCE)
+    with pytest.raises(ValueError, match="'sample_id'"):
+        label_writer.records_to_html(dict(sample_id="s01", volume=[10]))
+    with pytest.raises(ValueError, match="'volume'"):
+        as_records(dict(sample_id=["s01"], volume=10))
+    with pytest.raises(ValueError):
+        as_records(dict(volume=numpy.array(10)))
+
+
+def test_label_writer_accepts_tables():
+    label_writer = blabel.LabelWriter(item_template=SOURCE)
+    expected = label_writer.records_to_html(RECORDS)
+    dataframe = pandas.DataFrame(RECORDS)
+    assert label_writer.records_to_html(dataframe) == expected
+    assert label_writer.records_to_html(dict(dataframe.items())) == expected
+    label_writer.validate_records(dataframe)
+    assert label_writer.records_to_html(dataframe, workers=2, chunksize=2) == expected
+
+
+def test_arrow_tables():
+    pyarrow = pytest.importorskip("pyarrow")
+    table = pyarrow.Table.from_pylist(RECORDS)
+    assert [dict(record) for record in as_records(table)] == RECORDS
+    label_writer = blabel.LabelWriter(item_template=SOURCE)
+    assert label_writer.records_to_html(table) == label_writer.records_to_html(RECORDS)
@@ -0,0 +1,31 @@
+import json
+import subprocess
+import sys
+
+HEAVY_MODULES = ["weasyprint", "pypdf", "PIL", "qrcode", "barcode", "pystrich"]
+IMPORT_TIME_BUDGET = 1.0  # seconds, much more than needed on most machines
+
+SCRIPT = """
+import json, sys, time
+t0 = time.perf_counter()
+import blabel
+duration = time.perf_counter() - t0
+print(json.dumps(dict(
+    duration=duration, imported=[m for m in %r if m in sys.modules]
+)))
+""" % (HEAVY_MODULES,)
+
+
+def test_import_is_fast_and_lazy():
+    output = subprocess.check_output([sys.executable, "-c", SCRIPT])
+    result = json.loads(output.decode())
+    assert result["imported"] == []
+    assert result["duration"] < IMPORT_TIME_BUDGET
+
+    # Heavy dependencies are only imported when needed.
+    script = (
+        "import blabel, sys; blabel.label_tools.qr_code('a');"
+        "print(sorted(m for m in %r if m in sys.modules))" % (HEAVY_MODULES,)
+    )
+    output = subprocess.check_output([sys.executable, "-c", script])
+    assert output.decode().strip() == "['PIL', 'qrcode']"
@@ -0,0 +1,65 @@
+from blabel import label_tools
+
+
+def test_symbology_cache(tmpdir):
+    label_tools.configure_cache(maxsize=10, cache_dir=str(tmpdir))
+    cache = label_tools.SYMBOLOGY_CACHE
+    qr_data = label_tools.qr_code("s01")
+    assert label_tools.qr_code("s01") == qr_data
+    assert label_tools.qr_code("s01", box_size=3) != qr_data
+    label_tools.barcode("s01", module_width=1.5)
+    label_tools.barcode("s01", module_width=1.5)
+    label_tools.datamatrix("s01")
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 4
+
+    # New in-memory tier, same disk tier: images are read back from disk.
+    label_tools.configure_cache(maxsize=10, cache_dir=str(tmpdir))
+    assert label_tools.qr_code("s01") == qr_data
+    assert label_tools.SYMBOLOGY_CACHE.stats()["disk_hits"] == 1
+    label_tools.configure_cache()
+
+
+def test_svg_codes():
+    for data in [
+        label_tools.qr_code("s01", fmt="svg"),
+        label_tools.datamatrix("s01", fmt="svg"),
+        label_tools.datamatrix("s01", fmt="svg", with_border=True),
+    ]:
+        assert data.startswith("data:image/svg+xml;charset=utf-8;base64,")
+
+
+def test_batch_generation():
+    label_tools.configure_cache(maxsize=100)
+    data_list = ["s%02d" % (i % 7) for i in range(12)]
+    expected = [label_tools.barcode(data, fmt="svg") for data in data_list]
+    label_tools.configure_cache(maxsize=100)
+    codes = label_tools.barcode_batch(data_list, workers=2, chunksize=2, fmt="svg")
+    assert codes == expected
+    # The codes generated by the workers were added to the cache.
+    assert label_tools.barcode("s03", fmt="svg") == expected[3]
+    assert label_tools.SYMBOLOGY_CACHE.stats()["hits"] == 1
+    assert label_tools.qr_code_batch(["a", "b"]) == [
+        label_tools.qr_code("a"),
+        label_tools.qr_code("b"),
+    ]
+    label_tools.configure_cache()
+
+
+def test_cache_keys_include_the_data_types():
+    # Equal data of different types are encoded differently ("12" vs "12.0").
+    label_tools.configure_cache(maxsize=100)
+    expected = {}
+    for data in [1, True, 12, 12.0]:
+        label_tools.configure_cache(maxsize=100)
+        expected[repr(data)] = label_tools.barcode(data, fmt="svg")
+    assert expected["1"] != expected["True"]
+    assert expected["12"] != expected["12.0"]
+    label_tools.configure_cache(maxsize=100)
+    for data in [1, True, 12, 12.0]:
+        assert label_tools.barcode(data, fmt="svg") == expected[repr(data)]
+    label_tools.configure_cache(maxsize=100)
+    data_list = [12, 12.0, 1, True] * 2
+    codes = label_tools.barcode_batch(data_list, workers=2, chunksize=2, fmt="svg")
+    assert codes == [expected[repr(data)] for data in data_list]
+    label_tools.configure_cache()
@@ -0,0 +1,271 @@
+import os
+import time
+
+import blabel
+
+SAMPLES_DIR = os.path.join("tests", "data", "samples")
+TEMPLATE = os.path.join(SAMPLES_DIR, "qrcode_and_date", "item_template.html")
+
+
+def test_item_templates_are_compiled_once(tmpdir):
+    label_writer = blabel.LabelWriter(TEMPLATE)
+    assert blabel.LabelWriter(TEMPLATE).item_template is label_writer.item_template
+    source = "<b>{{ name }}</b>"
+    assert (
+        blabel.LabelWriter(item_template=source).item_template
+        is blabel.LabelWriter(item_template=source).item_template
+    )
+
+    # Editing a template file invalidates the cached template.
+    path = os.path.join(str(tmpdir), "template.html")
+    with open(path, "w") as f:
+        f.write(source)
+    assert blabel.LabelWriter(path).record_to_html(dict(name="A")) == "<b>A</b>"
+    with open(path, "w") as f:
+        f.write("<i>{{ name }}</i>")
+    os.utime(path, (0, 0))
+    assert blabel.LabelWriter(path).record_to_html(dict(name="A")) == "<i>A</i>"
+
+
+def test_record_variables_override_defaults_and_globals():
+    source = (
+        "{{ name }} {{ unit }} {{ len(name) }} {% for i in range(2) %}.{% endfor %}"
+    )
+    label_writer = blabel.LabelWriter(item_template=source, unit="mL", name="?")
+    assert label_writer.record_to_html(dict(name="A")) == "A mL 1 .."
+    assert label_writer.record_to_html(dict(name="BB", unit="L")) == "BB L 2 .."
+    # Changes of the default context, GLOBALS or template are taken into account.
+    label_writer.default_context["unit"] = "uL"
+    assert label_writer.record_to_html(dict(name="A")) == "A uL 1 .."
+    label_writer.default_context = dict(unit="nL")
+    assert label_writer.record_to_html(dict(name="A")) == "A nL 1 .."
+    blabel.blabel.GLOBALS["len"] = lambda value: "n"
+    try:
+        assert label_writer.record_to_html(dict(name="A")) == "A nL n .."
+    finally:
+        blabel.blabel.GLOBALS["len"] = len
+    label_writer.item_template = blabel.blabel.template_from_string("{{ unit }}")
+    assert label_writer.record_to_html(dict(name="A")) == "nL"
+
+
+def test_stylesheets_are_parsed_once(tmpdir):
+    path = os.path.join(str(tmpdir), "style.css")
+    with open(path, "w") as f:
+        f.write("@page { width: 20mm; height: 10mm; }")
+    (stylesheet,) = blabel.blabel.load_stylesheets([path])
+    assert blabel.blabel.load_stylesheets([path]) == [stylesheet]
+    os.utime(path, (0, 0))
+    assert blabel.blabel.load_stylesheets([path]) != [stylesheet]
+
+
+def slow_upper(text):
+    time.sleep(0.3)
+    return text.upper()
+
+
+def test_async_label_writer():
+    import asyncio
+
+    # The renders run in worker processes, so the context must be picklable.
+    label_writer = blabel.LabelWriter(
+        item_template="{{ upper(name) }}", upper=slow_upper
+    )
+
+    async def main():
+        async with blabel.AsyncLabelWriter(label_writer, max_concurrency=2) as writer:
+            records = [dict(name="a")]
+            results = await asyncio.gather(
+                writer.write_labels(records), writer.write_labels(records)
+            )
+            assert all(isinstance(data, bytes) for data in results)
+            try:
+                await writer.write_labels(records, timeout=0.05)
+            except asyncio.TimeoutError:
+                pass
+            else:
+                raise AssertionError("The render should have timed out.")
+
+    asyncio.run(main())
+
+
+def test_render_stats():
+    label_writer = blabel.LabelWriter(TEMPLATE, items_per_page=2)
+    records = [dict(sample_id="s%d" % i, sample_name="S%d" % i) for i in range(5)]
+    stats = blabel.RenderStats(n_slowest=2)
+    data = label_writer.write_labels(records, stats=stats, pages_per_batch=2)
+    assert stats.counts["record_to_html"] == 5
+    assert stats.counts["symbology.qr_code"] == 5
+    assert stats.counts["layout"] == 2
+    assert stats.sizes["pdf"] == len(data)
+    assert len(stats.slowest_records) == 2
+    assert "pdf_write" in stats.report()
+
+
+def test_repeated_images_are_hoisted():
+    label_writer = blabel.LabelWriter(
+        item_template="<img src='{{ label_tools.qr_code(\"logo\") }}'/>"
+        "<img src='{{ label_tools.qr_code(sample_id) }}'/>"
+    )
+    records = [dict(sample_id="s%d" % i) for i in range(10)]
+    html = label_writer.records_to_html(records)
+    new_html, resources = blabel.tools.hoist_data_uris(html)
+    assert len(resources) == 11
+    assert "data:image" not in new_html
+    assert len(new_html) < len(html) / 3
+    label_writer.write_labels(records)
+
+
+def test_page_cache():
+    from io import BytesIO
+
+    import pypdf
+
+    label_writer = blabel.LabelWriter(
+        item_template="<p>{{ name }}</p>", items_per_page=2
+    )
+    page_cache = blabel.caching.LRUCache(maxsize=100)
+    records = [dict(name="Label %d" % i) for i in range(6)]
+    label_writer.write_labels(records, page_cache=page_cache)
+    assert page_cache.stats()["misses"] == 3
+
+    # Only the page of the edited record is rendered again.
+    records[3] = dict(name="Edited label")
+    pdf_data = label_writer.write_labels(records, page_cache=page_cache)
+    assert page_cache.stats()["hits"] == 2
+    assert page_cache.stats()["misses"] == 4
+    pages = pypdf.PdfReader(BytesIO(pdf_data)).pages
+    assert len(pages) == 3
+    assert "Edited label" in pages[1].extract_text()
+    assert "Label 4" in pages[2].extract_text()
+
+
+def test_page_cache_with_css_objects(monkeypatch):
+    from io import BytesIO
+
+    import pypdf
+    from weasyprint import CSS
+
+    # Two different CSS objects which get the same id (as ids are reused
+    # once objects are garbage-collected) must not share cached pages.
+    monkeypatch.setattr(blabel.blabel, "id", lambda obj: 0, raising=False)
+    label_writer = blabel.LabelWriter(item_template="<p>{{ name }}</p>")
+    page_cache = blabel.caching.LRUCache(maxsize=100)
+    records = [dict(name="Label")]
+    widths = []
+    for width in (50, 80):
+        stylesheet = CSS(string="@page { size: %dmm 20mm; }" % width)
+        pdf_data = label_writer.write_labels(
+            records, extra_stylesheets=(stylesheet,), page_cache=page_cache
+        )
+        page = pypdf.PdfReader(BytesIO(pdf_data)).pages[0]
+        widths.append(round(float(page.mediabox.width) * 25.4 / 72))
+    assert widths == [50, 80]
+    assert page_cache.stats()["misses"] == page_cache.stats()["hits"] == 0
+
+
+def test_validate_records():
+    label_writer = blabel.LabelWriter(
+        item_template="""
+        <img src="{{ label_tools.barcode(code, barcode_class='ean13') }}"/>
+        <img src="{{ label_tools.datamatrix(name) }}"/>
+        """
+    )
+    assert label_writer.template_variables() == {"code", "name"}
+    records = [
+        dict(code="123456789012", name="ok"),
+        dict(code="12345678901A", name="bad code"),
+        dict(name="no code"),
+        dict(code="123456789012", name="too long for a datamatrix" * 200),
+    ]
+    try:
+        label_writer.write_labels(records, validate=True)
+    except blabel.RecordValidationError as error:
+        assert [index for index, _ in error.errors] == [1, 2, 3]
+        assert "missing variable(s) code" in error.errors[1][1]
+    else:
+        raise AssertionError("The invalid records were not reported.")
+    label_writer.validate_records(records[:1])
+
+
+def test_validate_records_of_unpicklable_writers():
+    import jinja2
+
+    # These writers can't be sent to worker processes: the records are
+    # validated serially.
+    label_writers = [
+        blabel.LabelWriter(item_template="{{ double(x) }}", double=lambda x: 2 * x),
+        blabel.LabelWriter(item_template=jinja2.Template("{{ x + 1 }}")),
+    ]
+    for label_writer in label_writers:
+        label_writer.validate_records([dict(x=1), dict(x=2)], workers=2)
+        try:
+            label_writer.validate_records([dict(x=1), dict(y=2)], workers=2)
+        except blabel.RecordValidationError as error:
+            assert [index for index, _ in error.errors] == [1]
+        else:
+            raise AssertionError("The invalid record was not reported.")
+
+
+def test_preview_pages():
+    from io import BytesIO
+
+    from PIL import Image
+
+    from blabel import preview
+
+    preview.configure_cache()
+    label_writer = blabel.LabelWriter(
+        item_template="<p>{{ name }}</p>", items_per_page=2
+    )
+    records = [dict(name="Label %d" % i) for i in range(5000)]
+    first_page, last_page = label_writer.preview_pages(records, pages=[0, 2499])
+    assert Image.open(BytesIO(first_page)).format == "PNG"
+    assert first_page != last_page
+    assert label_writer.preview_pages(records) == [first_page]
+    assert preview.PREVIEW_CACHE.stats()["hits"] == 1
+    small_page = label_writer.preview_pages(records, resolution=24)[0]
+    small_width = Image.open(BytesIO(small_page)).width
+    assert 4 * small_width - 3 <= Image.open(BytesIO(first_page)).width
+
+
+def test_pickling_and_parallel_html_generation():
+    import copy
+    import pickle
+
+    import jinja2
+
+    template = os.path.join(SAMPLES_DIR, "several_items_per_page", "item_template.html")
+    records = [dict(name="Name %d" % i, sex="MF"[i % 2]) for i in range(50)]
+    for label_writer in [
+        blabel.LabelWriter(template, items_per_page=2),
+        blabel.LabelWriter(item_template="<p>{{ name }}</p>", items_per_page=2),
+    ]:
+        unpickled = pickle.loads(pickle.dumps(label_writer))
+        assert unpickled.record_to_html(records[0]) == label_writer.record_to_html(
+            records[0]
+        )
+        html = label_writer.records_to_html(records, workers=2, chunksize=7)
+        assert html == label_writer.records_to_html(records)
+    # Writers of jinja2.Template objects can be copied, but not pickled.
+    label_writer = blabel.LabelWriter(item_template=jinja2.Template("{{ a }}"))
+    for copy_function in (copy.copy, copy.deepcopy):
+        assert copy_function(label_writer).record_to_html(dict(a=1)) == "1"
+    try:
+        pickle.dumps(label_writer)
+    except Exception:
+        pass
+    else:
+        raise AssertionError("Pickling should fail.")
+
+
+def test_parallel_html_generation_stats():
+    label_writer = blabel.LabelWriter(item_template="{{ upper(name) }}")
+    records = [dict(name="n%d" % i) for i in range(6)]
+    label_writer.default_context["upper"] = str.upper
+    stats = blabel.RenderStats(n_slowest=6)
+    label_writer.records_to_html(records, stats=stats, workers=2, chunksize=2)
+    assert stats.counts["record_to_html"] == 6
+    indices = sorted(index for (_, index, _) in stats.slowest_records)
+    assert indices == list(range(6))
+    for _, index, record in stats.slowest_records:
+        assert record == records[index]
@@ -0,0 +1,30 @@
+from blabel.raster import RasterLabelWriter
+
+FIELDS = [
+    dict(kind="datamatrix", data="{{ sample_id }}", x=2, y=2, width=10),
+    dict(kind="qr_code", data="{{ sample_id }}", x=13, y=2, width=10),
+    dict(kind="text", text="{{ sample_name }}", x=25, y=2, font_size=3),
+    dict(
+        kind="barcode",
+        data="{{ sample_id }}",
+        x=25,
+        y=8,
+        params=dict(module_width=0.25, module_height=5, write_text=False),
+    ),
+]
+
+
+def test_raster_label_writer(tmpdir):
+    writer = RasterLabelWriter(FIELDS, width=50, height=25, dpi=203)
+    records = [dict(sample_id="s%03d" % i, sample_name="S%d" % i) for i in range(6)]
+    image = writer.record_to_image(records[0])
+    assert image.mode == "1"
+    assert image.size == (400, 200)
+    assert image.getbbox() is not None
+
+    zpl_labels = writer.write_zpl(records).split("\n")
+    assert len(zpl_labels) == 6
+    assert zpl_labels[0].startswith("^XA^PW400^LL200^FO0,0^GFA,10000,10000,50,")
+    assert writer.write_zpl(records, workers=2, chunksize=2).split("\n") == zpl_labels
+    images = list(writer.records_to_images(records, workers=2, chunksize=4))
+    assert images[3].tobytes() == writer.record_to_image(records[3]).tobytes()
@@ -1,8 +1,10 @@
 import os
 import base64
+from io import BytesIO
 
 import pydenticon
 import pandas
+import pypdf
 
 import blabel
 
@@ -58,13 +60,23 @@ def test_labels_from_spreadsheet():
     dataframe = pandas.read_csv(
         os.path.join(SAMPLES_DIR, "labels_from_spreadsheet", "records.csv")
     )
-    records = dataframe.to_dict(orient="record")
+    records = dataframe.to_dict(orient="records")
     template, style = get_template_and_style("labels_from_spreadsheet")
     label_writer = blabel.LabelWriter(template, default_stylesheets=(style,))
     data = label_writer.write_labels(records, target=None)
     assert 18_000 > len(data) > 11_000
 
 
+def test_labels_from_spreadsheet_dataframe():
+    dataframe = pandas.read_csv(
+        os.path.join(SAMPLES_DIR, "labels_from_spreadsheet", "records.csv")
+    )
+    template, style = get_template_and_style("labels_from_spreadsheet")
+    label_writer = blabel.LabelWriter(template, default_stylesheets=(style,))
+    data = label_writer.write_labels(dataframe, target=None)
+    assert 18_000 > len(data) > 11_000
+
+
 def test_logo_and_datamatrix():
     records = [
         dict(sample_id="s01", sample_name="Sample 1"),
@@ -94,3 +106,44 @@ def test_several_items_per_page():
         base_url=os.path.join(SAMPLES_DIR, "several_items_per_page"),
     )
     assert 28_000 > len(data) > 15_000
+
+
+def test_write_labels_with_workers():
+    records = [dict(name="Person %d" % i, sex="MF"[i % 2]) for i in range(11)]
+    template, style = get_template_and_style("several_items_per_page")
+    label_writer = blabel.LabelWriter(
+        template, default_stylesheets=(style,), items_per_page=2
+    )
+    base_url = os.path.join(SAMPLES_DIR, "several_items_per_page")
+    data = label_writer.write_labels(records, base_url=base_url, workers=3)
+    assert len(pypdf.PdfReader(BytesIO(data)).pages) == 6
+
+
+def test_write_labels_in_batches_from_generator(tmpdir):
+    template, style = get_template_and_style("qrcode_and_date")
+    label_writer = blabel.LabelWriter(template, default_stylesheets=(style,))
+    records = (dict(sample_id="s%02d" % i, sample_name="S%d" % i) for i in range(7))
+    target = os.path.join(str(tmpdir), "target.pdf")
+    label_writer.write_labels(records, target=target, pages_per_batch=3)
+    assert len(pypdf.PdfReader(target).pages) == 7
+
+
+def test_write_labels_to_non_seekable_stream():
+    class Pipe:
+        def __init__(self):
+            self.chunks = []
+
+        def write(self, data):
+            self.chunks.append(bytes(data))
+
+    label_writer = blabel.LabelWriter(
+        item_template="<p>{{ name }}</p>", items_per_page=2
+    )
+    records = [dict(name="Label %d" % i) for i in range(5)]
+    pdf_data = label_writer.write_labels(records, target="@memoryview")
+    assert isinstance(pdf_data, memoryview)
+    for workers in (1, 2):
+        pipe = Pipe()
+        label_writer.write_labels(records, target=pipe, workers=workers)
+        reader = pypdf.PdfReader(BytesIO(b"".join(pipe.chunks)))
+        assert len(reader.pages) == 3
@@ -0,0 +1,54 @@
+import os
+import signal
+import threading
+
+import pytest
+
+from blabel.server import LabelServer, request_labels
+
+
+def test_label_server():
+    server = LabelServer(
+        ("127.0.0.1", 0),
+        workers=1,
+        warmup_record=dict(name="warmup", number=1),
+        item_template="<b>{{ name }}</b>{{ 1 / number }}",
+    )
+    address = server.server.server_address
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        data = request_labels([dict(name="A", number=1)] * 2, address)
+        assert data.startswith(b"%PDF")
+        with pytest.raises(RuntimeError):
+            request_labels([dict(name="B", number=0)], address)
+    finally:
+        server.shutdown()
+        thread.join()
+
+
+def test_label_server_recovers_from_dead_workers():
+    from blabel.server import _ping
+
+    server = LabelServer(("127.0.0.1", 0), workers=1, item_template="<b>{{ name }}</b>")
+    address = server.server.server_address
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        # Kill the worker, as the system would for a worker using too much memory.
+        os.kill(server.executor.submit(_ping).result(), signal.SIGKILL)
+        data = request_labels([dict(name="A")], address)
+        assert data.startswith(b"%PDF")
+    finally:
+        server.shutdown()
+        thread.join()
+
+
+def test_label_server_does_not_remove_other_files(tmpdir):
+    path = os.path.join(str(tmpdir), "labels.pdf")
+    with open(path, "wb") as f:
+        f.write(b"%PDF")
+    with pytest.raises(FileExistsError):
+        LabelServer(path, workers=1, item_template="{{ name }}")
+    with open(path, "rb") as f:
+        assert f.read() == b"%PDF"
@@ -0,0 +1,40 @@
+import os
+from io import BytesIO
+
+import pypdf
+import pytest
+
+import blabel
+from blabel.sheets import SheetLayout, get_sheet
+
+SAMPLES_DIR = os.path.join("tests", "data", "samples")
+
+
+def test_sheet_layout():
+    sheet = get_sheet("avery-l7651")
+    assert sheet.labels_per_sheet == 65
+    positions = sheet.positions()
+    assert positions[0] == (4.7, 10.7)
+    assert positions[6] == pytest.approx((4.7 + 40.6, 10.7 + 21.2))
+    assert sheet.starting_at(12).start_position == 12
+    assert sheet.start_position == 0
+    with pytest.raises(ValueError):
+        sheet.starting_at(65)
+    with pytest.raises(ValueError):
+        get_sheet("unknown-sheet")
+    small_sheet = SheetLayout(
+        100, 50, rows=2, columns=2, label_width=50, label_height=25
+    )
+    assert small_sheet.positions()[-1] == (50, 25)
+
+
+def test_labels_on_sheets():
+    template = os.path.join(SAMPLES_DIR, "several_items_per_page", "item_template.html")
+    records = [dict(name="Name %d" % i, sex="MF"[i % 2]) for i in range(60)]
+    sheet = get_sheet("avery-l7651").starting_at(10)
+    label_writer = blabel.LabelWriter(template, sheet=sheet)
+    html = label_writer.records_to_html(records)
+    assert html.count("class='item'") == 60
+    assert "left: 4.700mm; top: 53.100mm" in html  # 11th label
+    pdf_data = label_writer.write_labels(records)
+    assert len(pypdf.PdfReader(BytesIO(pdf_data)).pages) == 2
@@ -0,0 +1,60 @@
+import os
+from io import BytesIO
+
+import pypdf
+import pytest
+
+import blabel
+from blabel.stamping import parse_stamped_fields
+
+SAMPLES_DIR = os.path.join("tests", "data", "samples")
+
+ITEM_TEMPLATE = """
+<img data-stamp="code" class="code" src="{{ label_tools.datamatrix(sample_id) }}"/>
+<div data-stamp="name" class="name">{{ sample_name }}</div>
+<div class="footer">Made with blabel</div>
+"""
+
+
+def test_parse_stamped_fields():
+    fields = parse_stamped_fields(
+        "<img data-stamp src='a.png'/><div data-stamp='name'>Sample <b>1</b>"
+        " &amp;<br/>co</div><span>static</span>"
+    )
+    assert fields == [("image", "a.png"), ("text", "Sample 1 &\nco")]
+
+
+def test_write_stamped_labels(tmpdir):
+    style = os.path.join(SAMPLES_DIR, "logo_and_datamatrix", "style.css")
+    label_writer = blabel.LabelWriter(
+        item_template=ITEM_TEMPLATE, default_stylesheets=(style,), items_per_page=2
+    )
+    records = [dict(sample_id="s%02d" % i, sample_name="S%d" % i) for i in range(7)]
+    target = os.path.join(str(tmpdir), "stamped.pdf")
+    label_writer.write_stamped_labels(records, target=target)
+    reader = pypdf.PdfReader(target)
+    assert len(reader.pages) == 4
+    assert "S6" in reader.pages[3].extract_text()
+
+
+def test_write_stamped_labels_on_a_sheet():
+    from blabel.sheets import SheetLayout
+
+    # The items of sheet layouts are absolutely positioned.
+    sheet = SheetLayout(100, 50, rows=2, columns=2, label_width=50, label_height=25)
+    label_writer = blabel.LabelWriter(item_template=ITEM_TEMPLATE, sheet=sheet)
+    records = [dict(sample_id="s%02d" % i, sample_name="S%d" % i) for i in range(7)]
+    pdf_data = label_writer.write_stamped_labels(records)
+    reader = pypdf.PdfReader(BytesIO(pdf_data))
+    assert len(reader.pages) == 2
+    assert "S6" in reader.pages[1].extract_text()
+
+
+def test_unsupported_weasyprint_versions_raise_clear_errors():
+    from blabel.stamping import find_stamped_boxes
+
+    class PageWithoutBoxes:
+        pass
+
+    with pytest.raises(RuntimeError, match="weasyprint"):
+        find_stamped_boxes(PageWithoutBoxes())
@@ -0,0 +1,39 @@
+import os
+
+import pypdf
+
+from blabel import tools
+
+SAMPLE_PDF = os.path.join(
+    "tests", "data", "samples", "qrcode_and_date", "qrcode_and_date.pdf"
+)
+
+
+class NonSeekableStream:
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+
+
+def test_merge_pdfs_streams_the_pages(tmpdir):
+    with open(SAMPLE_PDF, "rb") as f:
+        sample = f.read()
+    sample_texts = [page.extract_text() for page in pypdf.PdfReader(SAMPLE_PDF).pages]
+    written = []
+    stream = NonSeekableStream()
+
+    def pdfs():
+        for _ in range(3):
+            yield sample
+            # The previous PDF was written before the next one is read.
+            written.append(len(stream.chunks))
+
+    tools.merge_pdfs(pdfs(), target=stream)
+    assert 0 < written[0] < written[1] < written[2]
+    target = os.path.join(str(tmpdir), "merged.pdf")
+    with open(target, "wb") as f:
+        f.write(b"".join(stream.chunks))
+    reader = pypdf.PdfReader(target, strict=True)
+    assert [page.extract_text() for page in reader.pages] == 3 * sample_texts